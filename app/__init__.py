@@ -1,6 +1,7 @@
-from flask import Flask, session
+from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from werkzeug.local import LocalProxy
 import os
 
 
@@ -22,12 +23,9 @@ def create_app():
 
     @app.context_processor
     def inject_user():
-        from app.models import User
-        user = None
-        if 'user_id' in session:
-            user = User.query.get(session['user_id'])
-
-        return dict(user=user)
+        # 模板真正用到 user 时才加载，同一请求内只加载一次
+        from app.auth import load_current_user
+        return dict(user=LocalProxy(load_current_user))
 
     # 初始化数据库
     db.init_app(app)
@@ -39,4 +37,13 @@ def create_app():
     from app.map import bp as map_bp
     app.register_blueprint(map_bp)
 
+    # 后台导入任务
+    from app import jobs
+    jobs.init_app(app)
+
+    # 日志和 /metrics
+    from app import logs, metrics
+    logs.init_logging()
+    metrics.init_app(app)
+
     return app
@@ -1,10 +1,26 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, g
+from config import USER_CACHE_TTL
 from app import db
 from app.models import User
+from app.passwords import PasswordBusyError, verify_password
+from app.utils import safe_str
+from collections import OrderedDict
+from concurrent.futures import TimeoutError
 from functools import wraps
+from types import SimpleNamespace
+import logging
+import threading
+import time
 
 bp = Blueprint('auth', __name__)
 
+logger = logging.getLogger(__name__)
+
+# 当前用户信息缓存条数
+USER_CACHE_SIZE = 1024
+_user_cache = OrderedDict()
+_user_cache_lock = threading.Lock()
+
 # 登录
 @bp.route('/login', methods=['GET', 'POST'])
 def login():
@@ -22,7 +38,24 @@ def login():
         
         user = User.query.filter(User.username==username).first()
 
-        if user and user.check_password(password):
+        ok = False
+        if user:
+            try:
+                ok, new_hash = verify_password(user.password_hash, password)
+            except (PasswordBusyError, TimeoutError):
+                flash('登录人数较多，请稍后再试！','error')
+                return render_template('login.html'), 503
+            if ok and new_hash:
+                # 哈希参数已更新，登录成功时顺便换成新哈希，失败不影响登录
+                try:
+                    user.password_hash = new_hash
+                    db.session.commit()
+                    invalidate_user(user.id)
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error("更新密码哈希失败 user_id=%s error=%s", user.id, safe_str(e))
+
+        if ok:
             session.permanent = True
             session['user_id'] = user.id
             flash('登录成功！','success')
@@ -49,4 +82,46 @@ def check_login(func):
         if 'user_id' not in session:
             return redirect(url_for('auth.login'))
         return func(*args, **kwargs)
-    return wrapper
\ No newline at end of file
+    return wrapper
+
+
+# 当前登录用户（模板里显示用）
+def load_current_user():
+    '''获取当前登录用户的 id 和用户名
+    1. 同一个请求内只加载一次，结果放在 g 上
+    2. 跨请求按 USER_CACHE_TTL 缓存在进程内，修改密码时调用 invalidate_user 清除
+    '''
+    if 'current_user' in g:
+        return g.current_user
+
+    user_id = session.get('user_id')
+    user = _cached_user(user_id) if user_id is not None else None
+    g.current_user = user
+    return user
+
+
+def _cached_user(user_id):
+    now = time.monotonic()
+    if USER_CACHE_TTL > 0:
+        with _user_cache_lock:
+            entry = _user_cache.get(user_id)
+            if entry is not None and entry[0] > now:
+                _user_cache.move_to_end(user_id)
+                return entry[1]
+
+    row = db.session.query(User.id, User.username).filter(User.id == user_id).first()
+    if row is None:
+        return None
+    user = SimpleNamespace(id=row.id, username=row.username)
+    if USER_CACHE_TTL > 0:
+        with _user_cache_lock:
+            _user_cache[user_id] = (now + USER_CACHE_TTL, user)
+            _user_cache.move_to_end(user_id)
+            while len(_user_cache) > USER_CACHE_SIZE:
+                _user_cache.popitem(last=False)
+    return user
+
+
+def invalidate_user(user_id):
+    with _user_cache_lock:
+        _user_cache.pop(user_id, None)
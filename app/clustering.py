@@ -0,0 +1,108 @@
+'''地图客户聚合
+ - 按缩放级别把经纬度切成瓦片（每个瓦片 360/2^zoom 度），每个瓦片再切成 CLUSTER_GRID x CLUSTER_GRID 个网格。
+ - 每个网格在数据库里 GROUP BY 聚合出数量、中心点和示例客户id，不把客户逐条取回。
+ - 结果按 (用户, 数据版本号, 缩放级别, 瓦片) 缓存在进程内 LRU 中，数据变化后版本号变化，旧缓存自然失效。
+'''
+import math
+import threading
+from collections import OrderedDict
+from sqlalchemy import func, select
+from config import CLUSTER_GRID, CLUSTER_CACHE_SIZE
+from app import db
+from app.models import Customer
+
+
+# 一次请求最多覆盖的瓦片数，防止缩放级别和视野不匹配时生成过多瓦片
+MAX_TILES = 256
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def _cache_get(key):
+    with _lock:
+        if key not in _cache:
+            return None
+        _cache.move_to_end(key)
+        return _cache[key]
+
+
+def _cache_put(key, value):
+    with _lock:
+        _cache[key] = value
+        _cache.move_to_end(key)
+        while len(_cache) > CLUSTER_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def tile_size(zoom):
+    """某个缩放级别下一个瓦片的宽度（度）"""
+    return 360.0 / (2 ** zoom)
+
+
+def get_clusters(user_id, revision, zoom, bbox):
+    """
+    返回视野内的聚合结果列表，每项为 {'count', 'lat', 'lng', 'sample_ids'}。
+    bbox=(最小经度, 最小纬度, 最大经度, 最大纬度)
+    """
+    min_lng, min_lat, max_lng, max_lat = bbox
+    size = tile_size(zoom)
+    tx_range = range(math.floor(min_lng / size), math.floor(max_lng / size) + 1)
+    ty_range = range(math.floor(min_lat / size), math.floor(max_lat / size) + 1)
+    if len(tx_range) * len(ty_range) > MAX_TILES:
+        return None
+
+    clusters = []
+    missing = []
+    for tx in tx_range:
+        for ty in ty_range:
+            cached = _cache_get((user_id, revision, zoom, tx, ty))
+            if cached is None:
+                missing.append((tx, ty))
+            else:
+                clusters.extend(cached)
+
+    if missing:
+        for tile, tile_clusters in _query_tiles(user_id, zoom, missing).items():
+            _cache_put((user_id, revision, zoom) + tile, tile_clusters)
+            clusters.extend(tile_clusters)
+    return clusters
+
+
+def _query_tiles(user_id, zoom, tiles):
+    """一次 GROUP BY 查询算出若干瓦片内所有网格的聚合结果，返回 {(tx, ty): [聚合结果]}"""
+    size = tile_size(zoom)
+    cell = size / CLUSTER_GRID
+    min_tx = min(tx for tx, _ in tiles)
+    max_tx = max(tx for tx, _ in tiles)
+    min_ty = min(ty for _, ty in tiles)
+    max_ty = max(ty for _, ty in tiles)
+
+    cx = func.floor(Customer.longitude / cell).label('cx')
+    cy = func.floor(Customer.latitude / cell).label('cy')
+    stmt = (select(cx, cy,
+                   func.count(Customer.id),
+                   func.avg(Customer.latitude),
+                   func.avg(Customer.longitude),
+                   func.min(Customer.id),
+                   func.max(Customer.id))
+            .where(Customer.owner_id == user_id,
+                   Customer.longitude >= min_tx * size,
+                   Customer.longitude < (max_tx + 1) * size,
+                   Customer.latitude >= min_ty * size,
+                   Customer.latitude < (max_ty + 1) * size)
+            .group_by(cx, cy))
+
+    result = {tile: [] for tile in tiles}
+    for x, y, count, lat, lng, min_id, max_id in db.session.execute(stmt):
+        tile = (int(x) // CLUSTER_GRID, int(y) // CLUSTER_GRID)
+        if tile not in result:
+            # 查询范围是所有缺失瓦片的外接矩形，会顺带算到已缓存的瓦片，忽略即可
+            continue
+        result[tile].append({
+            'count': count,
+            'lat': float(lat),
+            'lng': float(lng),
+            'sample_ids': sorted({min_id, max_id}),
+        })
+    return result
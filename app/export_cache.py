@@ -0,0 +1,131 @@
+'''导出文件磁盘缓存
+ - 缓存键为 (用户, 数据版本号, 格式)，数据不变时重复导出直接返回磁盘上的文件。
+ - 数据版本号变化后旧文件不会再被命中，写入新文件时顺带删除同一用户的旧版本。
+ - 总大小超过 EXPORT_CACHE_MAX_BYTES 时按最近访问时间（mtime）淘汰。
+'''
+import errno
+import os
+import shutil
+import tempfile
+import threading
+from config import EXPORT_CACHE_DIR, EXPORT_CACHE_MAX_BYTES
+
+
+_lock = threading.Lock()
+
+
+def enabled():
+    return EXPORT_CACHE_MAX_BYTES > 0
+
+
+def _path(owner_id, revision, variant):
+    return os.path.join(EXPORT_CACHE_DIR, f'{owner_id}_{revision}_{variant}')
+
+
+def get(owner_id, revision, variant):
+    """命中返回缓存文件路径并刷新访问时间，未命中返回 None"""
+    if not enabled():
+        return None
+    path = _path(owner_id, revision, variant)
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return path
+
+
+def put_file(owner_id, revision, variant, src_path):
+    """把已经生成好的文件移入缓存，返回缓存文件路径"""
+    os.makedirs(EXPORT_CACHE_DIR, exist_ok=True)
+    path = _path(owner_id, revision, variant)
+    try:
+        os.replace(src_path, path)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        # 源文件和缓存目录不在同一个文件系统，先复制到缓存目录的临时文件再原子替换
+        fd, tmp_path = tempfile.mkstemp(dir=EXPORT_CACHE_DIR, suffix='.tmp')
+        os.close(fd)
+        try:
+            shutil.copyfile(src_path, tmp_path)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        os.remove(src_path)
+    _cleanup(owner_id, revision, keep=path)
+    return path
+
+
+def temp_dir():
+    """生成导出文件的临时目录：缓存开启时用缓存目录，移入缓存只需重命名"""
+    if not enabled():
+        return None
+    os.makedirs(EXPORT_CACHE_DIR, exist_ok=True)
+    return EXPORT_CACHE_DIR
+
+
+def put_bytes(owner_id, revision, variant, data):
+    """把内存中的导出内容写入缓存，返回缓存文件路径"""
+    os.makedirs(EXPORT_CACHE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=EXPORT_CACHE_DIR, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    return put_file(owner_id, revision, variant, tmp_path)
+
+
+def tee(owner_id, revision, variant, chunks):
+    """
+    边输出边写入缓存的生成器，用于流式导出。
+    只有完整输出后才放入缓存，客户端中途断开时丢弃临时文件。
+    """
+    if not enabled():
+        yield from chunks
+        return
+
+    os.makedirs(EXPORT_CACHE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=EXPORT_CACHE_DIR, suffix='.tmp')
+    completed = False
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+                yield chunk
+        completed = True
+    finally:
+        if completed:
+            put_file(owner_id, revision, variant, tmp_path)
+        elif os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _cleanup(owner_id, revision, keep):
+    """删除同一用户的旧版本文件，并按访问时间淘汰超出容量的文件（刚写入的 keep 不淘汰）"""
+    with _lock:
+        entries = []
+        for name in os.listdir(EXPORT_CACHE_DIR):
+            if name.endswith('.tmp'):
+                continue
+            path = os.path.join(EXPORT_CACHE_DIR, name)
+            owner, _, rest = name.partition('_')
+            rev = rest.partition('_')[0]
+            try:
+                if owner == str(owner_id) and rev.isdigit() and int(rev) < revision:
+                    os.remove(path)
+                    continue
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= EXPORT_CACHE_MAX_BYTES:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -0,0 +1,138 @@
+'''高德地理编码 HTTP 客户端
+ - 复用一个 requests.Session，连接池长连接，不再每次请求都重新 TCP+TLS 握手。
+ - 5xx 和连接/读取超时按带抖动的指数退避重试（urllib3 Retry）。
+ - 连接超时和读取超时分开配置。
+ - 签名、请求、响应解析只有一份，单个和批量地理编码都走 GaodeClient.geocode。
+ - 每次 geocode 只发一次请求；批量结果条数对不上时返回 BATCH_MISMATCH，由调用方逐条重新请求（各自限流）。
+'''
+import logging
+import time
+from urllib.parse import urlencode
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from app import metrics
+from app.utils import generate_sign, safe_str
+
+
+logger = logging.getLogger(__name__)
+
+# 高德批量地理编码每次最多 10 个地址
+BATCH_LIMIT = 10
+# 批量结果条数和地址数对不上时每个地址的 status，调用方应逐条重新请求
+BATCH_MISMATCH = 'api错误：批量结果数量不一致'
+
+
+def new_result(status=None):
+    return {'ok': False, 'latitude': None, 'longitude': None, 'status': status, 'geocode': None}
+
+
+def parse_geocode(geocode):
+    """把高德返回的单个 geocode 解析为结果"""
+    result = new_result()
+    location = geocode.get('location') if isinstance(geocode, dict) else None
+    # 批量模式下解析失败的地址 location 为空字符串或 []
+    if location and isinstance(location, str):
+        lng, lat = location.split(',')
+        result.update(ok=True, latitude=float(lat), longitude=float(lng), status='成功', geocode=geocode)
+    else:
+        result['status'] = 'api错误：未返回location'
+    return result
+
+
+class GaodeClient:
+    """高德 Web 服务 API 客户端，线程安全，进程内共用一个实例"""
+
+    def __init__(self, key, security_key=None, base_url='https://restapi.amap.com',
+                 pool_size=10, retries=2, backoff=0.5, connect_timeout=3, read_timeout=8):
+        self.key = key
+        self.security_key = security_key
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+
+        retry = Retry(total=retries,
+                      connect=retries,
+                      read=retries,
+                      status=retries,
+                      status_forcelist=(500, 502, 503, 504),
+                      allowed_methods=frozenset(['GET']),
+                      backoff_factor=backoff,
+                      backoff_jitter=backoff,
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    @property
+    def configured(self):
+        return bool(self.key)
+
+    def geocode(self, addresses):
+        """
+        地理编码一组地址（最多 BATCH_LIMIT 个，多于一个时用 batch=true），返回与 addresses 顺序一致的结果列表。
+        结果格式 {'ok', 'latitude', 'longitude', 'status', 'geocode'}，geocode 为高德返回的 geocodes[i]。
+        """
+        if not self.configured:
+            return [new_result('未配置密钥') for _ in addresses]
+
+        params = {'address': '|'.join(addresses), 'output': 'json'}
+        if len(addresses) > 1:
+            params['batch'] = 'true'
+
+        try:
+            data = self._get('/v3/geocode/geo', params)
+        except Exception as e:
+            err = safe_str(e)
+            logger.warning("高德请求异常 count=%d address=%s error=%s", len(addresses), addresses[0], err)
+            return [new_result(f'请求失败：{err}') for _ in addresses]
+
+        if str(data.get('status')) != '1':
+            status = f"api错误：{safe_str(data.get('info', ''))}"
+            return [new_result(status) for _ in addresses]
+
+        geocodes = data.get('geocodes') or []
+        if len(geocodes) != len(addresses):
+            if len(addresses) == 1:
+                return [new_result(f"api错误：{safe_str(data.get('info', ''))}")]
+            # 返回条数对不上时无法确定对应关系，交给调用方逐条重新请求，这里不再额外发请求（绕过限流）
+            logger.warning("高德批量结果数量不一致 requested=%d returned=%d", len(addresses), len(geocodes))
+            return [new_result(BATCH_MISMATCH) for _ in addresses]
+        return [parse_geocode(geocode) for geocode in geocodes]
+
+    def _get(self, path, params):
+        """签名并发起 GET 请求，返回 JSON；网络错误、重试后仍为 HTTP 错误时抛出"""
+        params = dict(params, key=self.key)
+        sig = None
+        if self.security_key:
+            sig = generate_sign(params, self.security_key)
+            params['sig'] = sig
+
+        url = f"{self.base_url}{path}?{urlencode(params, doseq=True)}"
+        if logger.isEnabledFor(logging.DEBUG):
+            masked = url.replace(self.key, '***')
+            logger.debug("高德请求 url=%s", masked.replace(sig, '***') if sig else masked)
+
+        mode = 'batch' if params.get('batch') else 'single'
+        start = time.perf_counter()
+        try:
+            resp = self.session.get(url, timeout=self.timeout)
+            data = self._parse_response(resp)
+        except Exception:
+            metrics.gaode_request_duration.observe(time.perf_counter() - start, mode=mode)
+            metrics.gaode_requests.inc(mode=mode, result='http_error')
+            raise
+        metrics.gaode_request_duration.observe(time.perf_counter() - start, mode=mode)
+
+        if str(data.get('status')) == '1':
+            metrics.gaode_requests.inc(mode=mode, result='ok')
+        else:
+            metrics.gaode_requests.inc(mode=mode, result='api_error')
+            metrics.gaode_errors.inc(info=safe_str(data.get('info', ''))[:64])
+        return data
+
+    @staticmethod
+    def _parse_response(resp):
+        logger.debug("高德响应 status_code=%s body=%s", resp.status_code, resp.text[:500])
+        resp.raise_for_status()
+        return resp.json()
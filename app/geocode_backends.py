@@ -0,0 +1,110 @@
+'''地理编码后端，由 GEOCODER_BACKEND 选择
+ - gaode：高德 Web 服务 API（默认）。
+ - standin：同样走 GaodeClient，但请求发往 GEOCODER_STANDIN_URL 上的本地替身服务（standin_gaode.py），
+   不消耗高德配额，可注入延迟和错误率，用于压测导入和重试。
+ - gazetteer：离线地名表，从本地 CSV 或 SQLite 文件按归一化地址查坐标，不发网络请求。
+
+后端只需要实现：
+ - geocode(addresses)：返回与 addresses 顺序一致的结果列表，结果格式同 gaode.new_result / parse_geocode；
+   一次调用只发一次请求，批量结果对不上时返回 status 为 gaode.BATCH_MISMATCH 的结果，由 geocoder 逐条重新请求
+ - configured：是否可用（未配置时 geocode 返回“未配置密钥”一类的失败结果）
+ - batch_limit：一次 geocode 最多传入的地址数
+ - rate_limited：是否需要按 GEOCODE_QPS 限流
+ - cacheable：结果能否写入地理编码缓存（替身服务返回的是假坐标，不能写入）
+'''
+import csv
+import os
+import sqlite3
+import threading
+from config import (GAODE_SERVER_KEY, GAODE_SECURITY_KEY,
+                    GAODE_POOL_SIZE, GAODE_RETRIES, GAODE_RETRY_BACKOFF,
+                    GAODE_CONNECT_TIMEOUT, GAODE_READ_TIMEOUT,
+                    GEOCODE_MAX_WORKERS,
+                    GEOCODER_BACKEND, GEOCODER_GAZETTEER_PATH, GEOCODER_STANDIN_URL)
+from app.gaode import BATCH_LIMIT, GaodeClient, new_result, parse_geocode
+from app.utils import address_hash
+
+
+class GaodeBackend(GaodeClient):
+    """高德（或本地替身服务）"""
+    batch_limit = BATCH_LIMIT
+    rate_limited = True
+    cacheable = True
+
+
+class GazetteerBackend:
+    """
+    离线地名表。CSV 需要 address、latitude、longitude 三列，可选 formatted_address、level、adcode；
+    SQLite 文件读取其中的 gazetteer 表，列名相同。文件在第一次使用时加载到内存。
+    """
+    batch_limit = 100
+    rate_limited = False
+    cacheable = True
+
+    def __init__(self, path):
+        self.path = path
+        self._entries = None
+        self._lock = threading.Lock()
+
+    @property
+    def configured(self):
+        return bool(self.path) and os.path.exists(self.path)
+
+    def geocode(self, addresses):
+        if not self.configured:
+            return [new_result('未配置地名表') for _ in addresses]
+        entries = self._load()
+        results = []
+        for address in addresses:
+            geocode = entries.get(address_hash(address))
+            results.append(parse_geocode(geocode) if geocode else new_result('api错误：地名表中没有该地址'))
+        return results
+
+    def _load(self):
+        with self._lock:
+            if self._entries is None:
+                rows = self._read_sqlite() if self.path.endswith(('.db', '.sqlite', '.sqlite3')) else self._read_csv()
+                self._entries = {}
+                for row in rows:
+                    if not row.get('address') or row.get('latitude') in (None, '') or row.get('longitude') in (None, ''):
+                        continue
+                    self._entries[address_hash(row['address'])] = {
+                        'formatted_address': row.get('formatted_address') or row['address'],
+                        'location': f"{float(row['longitude'])},{float(row['latitude'])}",
+                        'level': row.get('level') or [],
+                        'adcode': row.get('adcode') or [],
+                    }
+            return self._entries
+
+    def _read_csv(self):
+        with open(self.path, newline='', encoding='utf-8-sig') as f:
+            return list(csv.DictReader(f))
+
+    def _read_sqlite(self):
+        conn = sqlite3.connect(self.path)
+        conn.row_factory = sqlite3.Row
+        try:
+            return [dict(row) for row in conn.execute('SELECT * FROM gazetteer')]
+        finally:
+            conn.close()
+
+
+def create_backend(name=None):
+    """按名称（默认 GEOCODER_BACKEND）创建地理编码后端"""
+    name = (name or GEOCODER_BACKEND).lower()
+    if name == 'gazetteer':
+        return GazetteerBackend(GEOCODER_GAZETTEER_PATH)
+    if name not in ('gaode', 'standin'):
+        raise ValueError(f'未知的地理编码后端：{name}')
+
+    options = dict(pool_size=max(GAODE_POOL_SIZE, GEOCODE_MAX_WORKERS),
+                   retries=GAODE_RETRIES,
+                   backoff=GAODE_RETRY_BACKOFF,
+                   connect_timeout=GAODE_CONNECT_TIMEOUT,
+                   read_timeout=GAODE_READ_TIMEOUT)
+    if name == 'standin':
+        # 替身服务不校验密钥和签名，没配置密钥时随便给一个
+        backend = GaodeBackend(GAODE_SERVER_KEY or 'standin', base_url=GEOCODER_STANDIN_URL, **options)
+        backend.cacheable = False
+        return backend
+    return GaodeBackend(GAODE_SERVER_KEY, security_key=GAODE_SECURITY_KEY, **options)
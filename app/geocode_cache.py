@@ -0,0 +1,181 @@
+import json
+import threading
+from datetime import datetime
+from sqlalchemy.exc import IntegrityError
+from config import GEOCODE_CACHE_TTL, GEOCODE_CACHE_MAX_ENTRIES
+from app import db
+from app.models import GeocodeCache
+from app.utils import address_hash
+
+
+# 每写入多少条缓存做一次淘汰检查，避免每次写入都 COUNT 整张表
+EVICT_EVERY = 200
+# 批量查询时每次 IN 查询的哈希数量
+LOOKUP_CHUNK = 500
+
+# 进程内命中统计
+_stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evicted': 0}
+_lock = threading.Lock()
+
+
+def _incr(key, n=1):
+    with _lock:
+        _stats[key] += n
+
+
+def lookup(address):
+    """按归一化地址查询缓存，命中返回缓存记录，未命中或已过期返回 None"""
+    if not address:
+        return None
+    entry = GeocodeCache.query.filter_by(address_hash=address_hash(address)).first()
+    now = datetime.now()
+    if entry is None or entry.created_at < now - GEOCODE_CACHE_TTL:
+        _incr('misses')
+        return None
+
+    entry.hit_count = (entry.hit_count or 0) + 1
+    entry.last_hit_at = now
+    _incr('hits')
+    return entry
+
+
+def lookup_many(addresses):
+    """批量查询缓存，返回 {地址: 缓存记录}，只包含命中且未过期的地址"""
+    keys = {}
+    for address in addresses:
+        if address:
+            keys.setdefault(address_hash(address), []).append(address)
+
+    found = {}
+    now = datetime.now()
+    hashes = list(keys)
+    for i in range(0, len(hashes), LOOKUP_CHUNK):
+        chunk = hashes[i:i + LOOKUP_CHUNK]
+        for entry in GeocodeCache.query.filter(GeocodeCache.address_hash.in_(chunk)):
+            if entry.created_at < now - GEOCODE_CACHE_TTL:
+                continue
+            entry.hit_count = (entry.hit_count or 0) + 1
+            entry.last_hit_at = now
+            for address in keys[entry.address_hash]:
+                found[address] = entry
+
+    _incr('hits', len(found))
+    _incr('misses', sum(len(v) for v in keys.values()) - len(found))
+    return found
+
+
+def store(address, latitude, longitude, geocode=None):
+    """保存地理编码结果，geocode 为高德返回的 geocodes[0]"""
+    if not address:
+        return
+    geocode = geocode or {}
+    key = address_hash(address)
+    now = datetime.now()
+
+    entry = GeocodeCache.query.filter_by(address_hash=key).first()
+    if entry is None:
+        entry = GeocodeCache(address_hash=key, address=address, hit_count=0)
+    entry.latitude = latitude
+    entry.longitude = longitude
+    entry.formatted_address = _short(geocode.get('formatted_address'), 255)
+    entry.level = _short(geocode.get('level'), 30)
+    entry.adcode = _short(geocode.get('adcode'), 20)
+    entry.raw = json.dumps(geocode, ensure_ascii=False) if geocode else None
+    entry.created_at = now
+    entry.last_hit_at = now
+
+    # 先把调用方的改动刷到数据库，保证下面的保存点只包含缓存记录
+    db.session.flush()
+    try:
+        with db.session.begin_nested():
+            db.session.add(entry)
+    except IntegrityError:
+        # 并发请求已经写入了同一地址，直接使用对方的结果
+        return
+
+    with _lock:
+        _stats['stores'] += 1
+        need_evict = _stats['stores'] % EVICT_EVERY == 0
+    if need_evict:
+        evict()
+
+
+def store_many(results):
+    """批量保存地理编码结果，results 为 {地址: (纬度, 经度, geocode)}"""
+    by_hash = {}
+    for address, (latitude, longitude, geocode) in results.items():
+        if address:
+            by_hash[address_hash(address)] = (address, latitude, longitude, geocode or {})
+    if not by_hash:
+        return
+
+    existing = {}
+    hashes = list(by_hash)
+    for i in range(0, len(hashes), LOOKUP_CHUNK):
+        for entry in GeocodeCache.query.filter(GeocodeCache.address_hash.in_(hashes[i:i + LOOKUP_CHUNK])):
+            existing[entry.address_hash] = entry
+
+    now = datetime.now()
+    entries = []
+    for key, (address, latitude, longitude, geocode) in by_hash.items():
+        entry = existing.get(key) or GeocodeCache(address_hash=key, address=address, hit_count=0)
+        entry.latitude = latitude
+        entry.longitude = longitude
+        entry.formatted_address = _short(geocode.get('formatted_address'), 255)
+        entry.level = _short(geocode.get('level'), 30)
+        entry.adcode = _short(geocode.get('adcode'), 20)
+        entry.raw = json.dumps(geocode, ensure_ascii=False) if geocode else None
+        entry.created_at = now
+        entry.last_hit_at = now
+        entries.append(entry)
+
+    db.session.flush()
+    try:
+        with db.session.begin_nested():
+            db.session.add_all(entries)
+    except IntegrityError:
+        # 有并发写入冲突时逐条保存
+        for address, latitude, longitude, geocode in by_hash.values():
+            store(address, latitude, longitude, geocode)
+        return
+
+    with _lock:
+        before = _stats['stores']
+        _stats['stores'] += len(entries)
+        need_evict = before // EVICT_EVERY != _stats['stores'] // EVICT_EVERY
+    if need_evict:
+        evict()
+
+
+def evict():
+    """删除过期缓存，并在超出容量时按最近命中时间淘汰最旧的记录"""
+    expired_before = datetime.now() - GEOCODE_CACHE_TTL
+    removed = GeocodeCache.query.filter(GeocodeCache.created_at < expired_before).delete(synchronize_session=False)
+
+    excess = GeocodeCache.query.count() - GEOCODE_CACHE_MAX_ENTRIES
+    if excess > 0:
+        ids = [row.id for row in GeocodeCache.query.with_entities(GeocodeCache.id)
+                                             .order_by(GeocodeCache.last_hit_at)
+                                             .limit(excess)]
+        if ids:
+            removed += GeocodeCache.query.filter(GeocodeCache.id.in_(ids)).delete(synchronize_session=False)
+    _incr('evicted', removed)
+    return removed
+
+
+def stats():
+    """缓存命中统计，hits 即节省的高德 API 调用次数"""
+    with _lock:
+        data = dict(_stats)
+    total = data['hits'] + data['misses']
+    data['hit_rate'] = round(data['hits'] / total, 4) if total else 0.0
+    data['entries'] = GeocodeCache.query.count()
+    data['total_hits'] = int(db.session.query(db.func.coalesce(db.func.sum(GeocodeCache.hit_count), 0)).scalar())
+    return data
+
+
+def _short(value, length):
+    if value is None or isinstance(value, list):
+        # 高德对空字段返回 []
+        return None
+    return str(value)[:length]
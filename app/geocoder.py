@@ -0,0 +1,125 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import GEOCODE_MAX_WORKERS, GEOCODE_QPS, GEOCODE_PROCESSES, GEOCODE_BATCH_SIZE
+from app import geocode_cache
+from app.gaode import BATCH_MISMATCH
+from app.geocode_backends import create_backend
+
+
+class TokenBucket:
+    """令牌桶限流：每秒补充 rate 个令牌，最多积攒 capacity 个；rate <= 0 表示不限流"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = capacity or max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+# 进程内共享的线程池、令牌桶和地理编码后端（高德客户端带连接池），所有请求共用同一份高德配额；
+# 令牌桶只在进程内生效，高德配额按 GEOCODE_PROCESSES 个进程平分
+_executor = ThreadPoolExecutor(max_workers=max(1, GEOCODE_MAX_WORKERS), thread_name_prefix='geocode')
+_bucket = TokenBucket(GEOCODE_QPS / GEOCODE_PROCESSES)
+_backend = create_backend()
+
+
+def results_cacheable():
+    """当前后端的结果能否写入地理编码缓存"""
+    return _backend.cacheable
+
+
+def request_geocode(address):
+    """
+    请求地理编码后端（默认高德，见 GEOCODER_BACKEND），只负责请求和解析，不修改数据库。
+    返回 {'ok', 'latitude', 'longitude', 'status', 'geocode'}，geocode 为高德格式的 geocodes[0]。
+    和批量请求共用 GEOCODE_QPS 令牌桶。
+    """
+    if _backend.rate_limited:
+        _bucket.acquire()
+    return _backend.geocode([address or ''])[0]
+
+
+def request_geocode_batch(addresses):
+    """
+    批量地理编码（高德为 batch=true，最多 10 个地址，用 | 分隔）。
+    返回与 addresses 顺序一致的结果列表，单个地址解析失败不影响其他地址。
+    """
+    return _backend.geocode(addresses)
+
+
+def _limited_batch_request(batch):
+    # 一次 HTTP 请求消耗一个令牌，无论其中有几个地址；离线后端不限流
+    if _backend.rate_limited:
+        _bucket.acquire()
+    results = request_geocode_batch(batch)
+    if len(batch) > 1 and any(r['status'] == BATCH_MISMATCH for r in results):
+        # 批量结果条数对不上，逐条重新请求，每条各占一个令牌
+        return [_limited_batch_request([address])[0] for address in batch]
+    return results
+
+
+def _make_batches(addresses, size):
+    """按 size 分组；地址里本身带 | 的无法放进批量请求，单独成组"""
+    batches = []
+    current = []
+    for address in addresses:
+        if '|' in address:
+            batches.append([address])
+            continue
+        current.append(address)
+        if len(current) >= size:
+            batches.append(current)
+            current = []
+    if current:
+        batches.append(current)
+    return batches
+
+
+def geocode_addresses(addresses):
+    """
+    并发地理编码一组地址，返回 {地址: 结果}，结果格式同 request_geocode。
+    先批量查缓存，未命中的地址按 GEOCODE_BATCH_SIZE 分组，交给线程池并按 GEOCODE_QPS 限流请求高德；
+    线程里只做网络请求，缓存的读写都在调用线程完成。
+    """
+    unique = list(dict.fromkeys(a for a in addresses if isinstance(a, str) and a.strip()))
+    results = {}
+
+    for address, entry in geocode_cache.lookup_many(unique).items():
+        results[address] = {
+            'ok': True,
+            'latitude': entry.latitude,
+            'longitude': entry.longitude,
+            'status': '成功',
+            'geocode': None,
+        }
+
+    pending = [a for a in unique if a not in results]
+    if pending:
+        batch_size = min(max(1, GEOCODE_BATCH_SIZE), _backend.batch_limit)
+        batches = _make_batches(pending, batch_size)
+        for batch, batch_results in zip(batches, _executor.map(_limited_batch_request, batches)):
+            results.update(zip(batch, batch_results))
+
+        if _backend.cacheable:
+            geocode_cache.store_many({
+                address: (r['latitude'], r['longitude'], r['geocode'])
+                for address, r in results.items()
+                if r['ok'] and r['geocode'] is not None
+            })
+    return results
@@ -0,0 +1,150 @@
+'''后台导入任务
+ - 上传的文件先保存到 IMPORT_UPLOAD_DIR，并在 import_jobs 表里记录一条 pending 任务。
+ - 任务交给进程内的线程池执行，不依赖 Celery/Redis 等外部组件。
+ - 执行前用条件 UPDATE 抢占任务（pending -> running），多个 gunicorn 进程之间不会重复执行。
+ - 服务重启后未执行的任务可以用 flask resume-imports 重新提交。
+ - 执行中随进程退出而中断的任务（running 超过 IMPORT_STALE_AFTER 秒）在启动时和 resume-imports 时标记为失败并删除上传文件；
+   已导入的部分保留，不自动重跑，避免重复导入。
+'''
+import json
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from config import IMPORT_UPLOAD_DIR, IMPORT_WORKERS, IMPORT_STALE_AFTER
+from app import db
+from app import service
+from app.models import ImportJob
+from app.utils import safe_str
+
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=max(1, IMPORT_WORKERS), thread_name_prefix='import')
+
+
+def submit_import(file, user_id):
+    """保存上传文件并创建导入任务，立即返回任务"""
+    os.makedirs(IMPORT_UPLOAD_DIR, exist_ok=True)
+    ext = os.path.splitext(file.filename)[1].lower()
+    file_path = os.path.join(IMPORT_UPLOAD_DIR, f'{uuid.uuid4().hex}{ext}')
+    file.save(file_path)
+
+    job = ImportJob(owner_id=user_id,
+                    filename=file.filename,
+                    file_path=file_path,
+                    status='pending')
+    try:
+        db.session.add(job)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        os.remove(file_path)
+        raise
+
+    _submit(job.id)
+    return job
+
+
+def get_job(job_id, user_id):
+    """获取当前用户的导入任务"""
+    job = ImportJob.query.get(job_id)
+    if job is None or job.owner_id != user_id:
+        return None
+    return job
+
+
+def resume_pending_jobs():
+    """重新提交所有未开始的任务（服务重启后使用）"""
+    ids = [job.id for job in ImportJob.query.filter_by(status='pending').order_by(ImportJob.id)]
+    for job_id in ids:
+        _submit(job_id)
+    return len(ids)
+
+
+def fail_stale_jobs():
+    """把 running 超过 IMPORT_STALE_AFTER 秒的任务标记为失败并删除上传文件，返回处理的任务数"""
+    cutoff = datetime.now() - timedelta(seconds=IMPORT_STALE_AFTER)
+    jobs = ImportJob.query.filter(ImportJob.status == 'running', ImportJob.started_at < cutoff).all()
+    count = 0
+    for job in jobs:
+        # 条件 UPDATE，避免和其他进程同时处理
+        updated = ImportJob.query.filter_by(id=job.id, status='running').update(
+            {'status': 'failed',
+             'message': '导入中断（服务重启），已导入的部分已保存，请核对后重新导入剩余数据',
+             'finished_at': datetime.now()}, synchronize_session=False)
+        db.session.commit()
+        if updated != 1:
+            continue
+        count += 1
+        logger.warning("导入任务中断，已标记为失败 job_id=%s started_at=%s", job.id, job.started_at)
+        if os.path.exists(job.file_path):
+            os.remove(job.file_path)
+    return count
+
+
+def _submit(job_id):
+    app = current_app._get_current_object()
+    _executor.submit(_run_import, app, job_id)
+
+
+def _claim(job_id):
+    """抢占任务，返回是否抢占成功"""
+    claimed = ImportJob.query.filter_by(id=job_id, status='pending').update(
+        {'status': 'running', 'started_at': datetime.now()}, synchronize_session=False)
+    db.session.commit()
+    return claimed == 1
+
+
+def _run_import(app, job_id):
+    with app.app_context():
+        if not _claim(job_id):
+            return
+        job = ImportJob.query.get(job_id)
+
+        def progress(parsed, inserted, geocoded, failed):
+            job.rows_parsed = parsed
+            job.rows_inserted = inserted
+            job.rows_geocoded = geocoded
+            job.rows_failed = failed
+            db.session.commit()
+
+        try:
+            result = service.read_excel_to_db(job.file_path, job.owner_id,
+                                              progress=progress, filename=job.filename)
+            job.status = 'done' if result['code'] == 0 else 'failed'
+            job.message = result['msg'][:255]
+            if result['data']:
+                job.errors = json.dumps(result['data']['errors'], ensure_ascii=False)
+        except Exception as e:
+            db.session.rollback()
+            job.status = 'failed'
+            job.message = f'导入失败：{safe_str(e)}'[:255]
+        finally:
+            job.finished_at = datetime.now()
+            db.session.commit()
+            if os.path.exists(job.file_path):
+                os.remove(job.file_path)
+
+
+def _fail_stale_jobs_on_startup(app):
+    with app.app_context():
+        try:
+            fail_stale_jobs()
+        except Exception as e:
+            # 数据库未迁移（flask db upgrade 之前）时表还不存在
+            db.session.rollback()
+            logger.debug("启动时检查中断的导入任务失败 error=%s", safe_str(e))
+
+
+def init_app(app):
+    _fail_stale_jobs_on_startup(app)
+
+    @app.cli.command('resume-imports')
+    def resume_imports():
+        """处理中断的导入任务，重新提交未执行的导入任务"""
+        failed = fail_stale_jobs()
+        count = resume_pending_jobs()
+        print(f"已将 {failed} 个中断的导入任务标记为失败，已重新提交 {count} 个导入任务")
@@ -0,0 +1,46 @@
+'''日志配置
+ - LOG_LEVEL 控制级别，地理编码请求等逐条明细是 DEBUG 级别，默认 INFO 时不输出；设为 OFF 关闭应用日志。
+ - LOG_FORMAT=json 时每条日志输出一行 JSON，logger.info(..., extra={...}) 里的字段一并输出，方便日志系统检索。
+'''
+import json
+import logging
+from config import LOG_FORMAT, LOG_LEVEL
+
+
+# LogRecord 自带的属性，其余都是通过 extra 传入的字段
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        data.update((k, v) for k, v in vars(record).items() if k not in _RESERVED)
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def init_logging():
+    logger = logging.getLogger('app')
+    if LOG_LEVEL.upper() == 'OFF':
+        # disabled 只对 app 本身生效，app.gaode 等子 logger 仍会传到根 logger 的兜底输出，这里整棵关掉
+        logger.setLevel(logging.CRITICAL + 1)
+        logger.propagate = False
+        if not logger.handlers:
+            logger.addHandler(logging.NullHandler())
+        return
+    logger.setLevel(LOG_LEVEL.upper())
+    if logger.handlers:
+        return
+    handler = logging.StreamHandler()
+    if LOG_FORMAT == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    logger.addHandler(handler)
+    logger.propagate = False
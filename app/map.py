@@ -1,13 +1,63 @@
+import os
+import hashlib
+from datetime import timezone
+from functools import wraps
 from app import db
-from config import GAODE_WEB_KEY, GAODE_SECURITY_CODE
-from flask import render_template, request, redirect, url_for, jsonify, session, Response,flash
+from config import GAODE_WEB_KEY, GAODE_SECURITY_CODE, MAP_DATA_DEFAULT_LIMIT, MAP_DATA_MAX_LIMIT, CLUSTER_MAX_ZOOM
+from flask import render_template, request, redirect, url_for, jsonify, session, Response,flash, stream_with_context, send_file, make_response, g
 from app.auth import check_login
-from app.utils import safe_str, validate_file
+from app.utils import safe_str, validate_file, parse_bbox, compress_response
 from flask import Blueprint
 from app import service
+from app import geocode_cache
+from app import jobs
+from app import export_cache
+from app import clustering
 
 bp = Blueprint('map', __name__)
 
+
+# 按用户数据版本号生成 ETag / Last-Modified，数据没变时返回 304，不查询客户表
+def revision_etag(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        user_id = session.get('user_id')
+        revision, updated_at = service.get_data_revision(user_id)
+        # 视图里要用版本号时直接取 g.data_revision，不再查一次
+        g.data_revision = revision
+        # 同一版本下不同参数、格式、压缩方式的响应内容不同，ETag 也要区分
+        variant = '|'.join([request.full_path,
+                            request.headers.get('Accept', ''),
+                            request.headers.get('Accept-Encoding', '')])
+        etag = f"{user_id}-{revision}-{hashlib.md5(variant.encode('utf-8')).hexdigest()[:16]}"
+        last_modified = updated_at.astimezone(timezone.utc) if updated_at else None
+
+        # 有待显示的提示消息时页面内容会变化，不走 304，响应也不能带 ETag，否则以后会一直复用带提示消息的页面
+        has_flashes = '_flashes' in session
+        if not has_flashes:
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(etag)
+            else:
+                not_modified = (last_modified is not None
+                                and request.if_modified_since is not None
+                                and last_modified.replace(microsecond=0) <= request.if_modified_since)
+            if not_modified:
+                response = Response(status=304)
+                response.set_etag(etag)
+                return response
+
+        response = make_response(func(*args, **kwargs))
+        if has_flashes or '_flashes' in session:
+            response.headers['Cache-Control'] = 'no-store'
+        elif response.status_code == 200:
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    return wrapper
+
+
 # 首页加地图
 @bp.route('/')
 @check_login
@@ -21,21 +71,99 @@ def index():
 # 客户列表
 @bp.route('/customers/')
 @check_login
+@revision_etag
 def list_customers():
     user_id = session.get('user_id')
-    page = request.args.get('page',1,type=int)
-    customers = service.get_customer_paginate(user_id,page=page)
+    after = request.args.get('after',type=int)
+    before = request.args.get('before',type=int)
+    start = request.args.get('start',1,type=int)
+    customers = service.get_customer_page(user_id,after=after,before=before,start=start,revision=g.data_revision)
     return render_template('customers.html',customers=customers)
 
 
 # 客户数据 json 
 @bp.route('/customers/data')
 @check_login
+@revision_etag
 def customers_data():
     # 获取当前登录用户的客户数据 校验
     user_id = session.get('user_id')
-    customers = service.get_customer_data(user_id)
-    return jsonify([customer.to_dict() for customer in customers])
+
+    # 带 bbox 时只返回地图视野内的客户
+    bbox = None
+    limit = None
+    if request.args.get('bbox'):
+        bbox = parse_bbox(request.args.get('bbox'))
+        if bbox is None:
+            return jsonify({'code': 400, 'message': 'bbox 格式错误'}), 400
+        limit = request.args.get('limit', MAP_DATA_DEFAULT_LIMIT, type=int)
+        limit = max(1, min(limit, MAP_DATA_MAX_LIMIT))
+
+    # 列式格式：id/纬度/经度/姓名 四个平行数组，不重复键名
+    if _wants_columnar():
+        response = jsonify(service.get_customer_columns(user_id, bbox=bbox, limit=limit))
+    else:
+        customers = service.get_customer_data(user_id, bbox=bbox, limit=limit)
+        response = jsonify([customer.to_dict() for customer in customers])
+    response.vary.add('Accept')
+    return compress_response(response)
+
+
+COLUMNAR_MIMETYPE = 'application/vnd.customers.columnar+json'
+
+
+def _wants_columnar():
+    """?format=columnar 或 Accept 中明确带了列式格式"""
+    if request.args.get('format') == 'columnar':
+        return True
+    return any(mimetype == COLUMNAR_MIMETYPE for mimetype, _ in request.accept_mimetypes)
+
+
+# 单个客户详情 json：地图标记点击时再加载地址和电话
+@bp.route('/customers/<int:customer_id>/detail')
+@check_login
+def customer_detail(customer_id):
+    user_id = session.get('user_id')
+    customer = service.edit_customer(customer_id,user_id)
+    if customer is None:
+        return jsonify({'code': 404, 'message': '客户不存在'}), 404
+    return jsonify(customer.to_dict())
+
+# 客户聚合数据 json：低缩放级别返回网格聚合，超过 CLUSTER_MAX_ZOOM 返回单个客户
+@bp.route('/customers/clusters')
+@check_login
+@revision_etag
+def customers_clusters():
+    user_id = session.get('user_id')
+    zoom = request.args.get('zoom', type=int)
+    bbox = parse_bbox(request.args.get('bbox'))
+    if zoom is None or bbox is None:
+        return jsonify({'code': 400, 'message': '缺少 zoom 或 bbox 参数'}), 400
+    zoom = max(0, min(zoom, 20))
+
+    if zoom > CLUSTER_MAX_ZOOM:
+        if _wants_columnar():
+            response = jsonify({
+                'mode': 'points',
+                'columns': service.get_customer_columns(user_id, bbox=bbox, limit=MAP_DATA_MAX_LIMIT),
+            })
+        else:
+            customers = service.get_customer_data(user_id, bbox=bbox, limit=MAP_DATA_MAX_LIMIT)
+            response = jsonify({
+                'mode': 'points',
+                'customers': [customer.to_dict() for customer in customers],
+            })
+        response.vary.add('Accept')
+        return compress_response(response)
+
+    clusters = clustering.get_clusters(user_id, g.data_revision, zoom, bbox)
+    if clusters is None:
+        return jsonify({'code': 400, 'message': '视野范围过大'}), 400
+    return compress_response(jsonify({
+        'mode': 'clusters',
+        'clusters': clusters,
+    }))
+
 
 # 重试编码
 @bp.route('/geocode/retry', methods=['POST'])
@@ -59,6 +187,13 @@ def retry_geocode():
         }), 500
 
 
+# 地理编码缓存命中统计
+@bp.route('/geocode/cache/stats')
+@check_login
+def geocode_cache_stats():
+    return jsonify(geocode_cache.stats())
+
+
 # 点击添加客户 GET 跳转到添加客户页
 @bp.route('/customers/add/',methods=['GET'])
 @check_login
@@ -143,22 +278,39 @@ def delete(customer_id):
 # 搜索客户
 @bp.route('/customers/search/')
 @check_login
+@revision_etag
 def search():
     keyword = request.args.get('keyword', '').strip()
     user_id = session.get('user_id')
 
-    result = service.search_customer(user_id,keyword)
+    page = request.args.get('page', 1, type=int)
+
+    result = service.search_customer(user_id, keyword, page=page)
 
     total = result['count']
     customers_data = result['customers_data']
     return render_template('search_results.html',
                             keyword=keyword,
                             count=total,
+                            page=result['page'],
+                            pages=result['pages'],
                             customers_data=customers_data,
                             web_key=GAODE_WEB_KEY,
                             s_code=GAODE_SECURITY_CODE)
 
 
+# 搜索框输入联想 json
+@bp.route('/customers/suggest')
+@check_login
+@revision_etag
+def suggest_customers():
+    user_id = session.get('user_id')
+    prefix = request.args.get('q', '')
+    limit = request.args.get('limit', 10, type=int)
+    data = service.suggest_customers(user_id, prefix, limit=limit, revision=g.data_revision)
+    return jsonify({'code': 0, 'data': data})
+
+
 # 导入客户数据
 @bp.route('/customers/import/', methods=['POST'])
 @check_login
@@ -183,9 +335,34 @@ def import_customers():
             'data': None
         }
 
-    # 调用service层的函数处理文件并导入数据
-    result = service.read_excel_to_db(file, user_id)
-    return jsonify(result)
+    # 保存文件并提交后台导入任务，立即返回任务ID，前端通过状态接口轮询进度
+    job = jobs.submit_import(file, user_id)
+    return jsonify({
+        'code': 0,
+        'msg': '导入任务已提交',
+        'data': {
+            'job_id': job.id,
+            'status_url': url_for('map.import_status', job_id=job.id),
+        }
+    }), 202
+
+
+# 导入任务进度
+@bp.route('/customers/import/<int:job_id>/status', methods=['GET'])
+@check_login
+def import_status(job_id):
+    user_id = session.get('user_id')
+    job = jobs.get_job(job_id, user_id)
+    if job is None:
+        return jsonify({
+            'code': 404,
+            'message': '导入任务不存在',
+        }), 404
+    return jsonify({
+        'code': 0,
+        'msg': job.message or '',
+        'data': job.to_dict()
+    })
 
 
 # 导出客户数据
@@ -193,34 +370,77 @@ def import_customers():
 @check_login
 def export_customers(format):
     user_id = session.get('user_id')
-    
-    output = service.output_excel(format,user_id)
-    if format == 'csv':
-        return Response(
-            output,
-            mimetype='text/csv',
-            headers={
-                'Content-Disposition': f'attachment;filename=customers.csv'
-            }
-        )
-    elif format == 'xls':
-        return Response(
-            output,
-            mimetype='application/vnd.ms-excel',
-            headers={
-                'Content-Disposition': f'attachment;filename=customers.xls'
-            }
-        )
-    elif format == 'xlsx':
-        return Response(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            headers={
-                'Content-Disposition': f'attachment;filename=customers.xlsx'
-            }
-        )
-    else:
+
+    if format not in EXPORT_MIMETYPES:
         return jsonify({
             'code': 400,
             'message': '不支持的格式'
         }), 400
+
+    # 数据没有变化时直接返回缓存的导出文件
+    revision, _ = service.get_data_revision(user_id)
+    compress = (format == 'csv'
+                and request.args.get('gzip') in ('1', 'true')
+                and 'gzip' in request.accept_encodings)
+    with_geo = format == 'xlsx' and request.args.get('geo') in ('1', 'true')
+    variant = format + ('.gz' if compress else '') + ('-geo' if with_geo else '')
+
+    cached_path = export_cache.get(user_id, revision, variant)
+    if cached_path:
+        return _send_export(cached_path, format, compress)
+
+    if format == 'csv':
+        # 流式输出，?gzip=1 且浏览器支持时启用 gzip 压缩；输出完整后写入缓存
+        headers = {
+            'Content-Disposition': f'attachment;filename=customers.csv'
+        }
+        if compress:
+            headers['Content-Encoding'] = 'gzip'
+            headers['Vary'] = 'Accept-Encoding'
+        chunks = service.iter_customers_csv(user_id, compress=compress)
+        return Response(
+            stream_with_context(export_cache.tee(user_id, revision, variant, chunks)),
+            mimetype=EXPORT_MIMETYPES['csv'],
+            headers=headers
+        )
+
+    if format == 'xlsx':
+        # 只写模式写入临时文件后发送
+        path = service.write_customers_xlsx(user_id, with_geo=with_geo, dir=export_cache.temp_dir())
+        if export_cache.enabled():
+            return _send_export(export_cache.put_file(user_id, revision, variant, path), format)
+        # 不缓存时响应结束后删除临时文件
+        response = _send_export(path, format)
+        response.call_on_close(lambda: os.path.exists(path) and os.remove(path))
+        return response
+
+    output = service.output_excel(format,user_id)
+    if export_cache.enabled():
+        return _send_export(export_cache.put_bytes(user_id, revision, variant, output.getvalue()), format)
+    return Response(
+        output,
+        mimetype=EXPORT_MIMETYPES['xls'],
+        headers={
+            'Content-Disposition': f'attachment;filename=customers.xls'
+        }
+    )
+
+
+EXPORT_MIMETYPES = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'xls': 'application/vnd.ms-excel',
+}
+
+
+def _send_export(path, format, compressed=False):
+    response = send_file(
+        path,
+        mimetype=EXPORT_MIMETYPES[format],
+        as_attachment=True,
+        download_name=f'customers.{format}'
+    )
+    if compressed:
+        response.headers['Content-Encoding'] = 'gzip'
+        response.headers['Vary'] = 'Accept-Encoding'
+    return response
@@ -0,0 +1,161 @@
+'''进程内指标，/metrics 按 Prometheus 文本格式输出
+ - 路由耗时直方图、每个请求的数据库查询次数和耗时、高德接口耗时和结果、地理编码缓存命中、导入导出行数。
+ - 不依赖 prometheus_client；多进程部署（gunicorn 多 worker）时每个进程单独统计，抓取到的是其中一个进程。
+ - 配置了 METRICS_TOKEN 时需要带 Authorization: Bearer <token> 才能访问 /metrics。
+'''
+import threading
+import time
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from config import METRICS_TOKEN
+
+
+# 直方图分桶：耗时（秒）、次数
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+_lock = threading.Lock()
+_registry = []
+
+
+class Counter:
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.values = {}
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with _lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f'{self.name}{_labels(key)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.values = {}
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with _lock:
+            buckets, total, count = self.values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    buckets[i] += 1
+            self.values[key] = (buckets, total + value, count + 1)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with _lock:
+            for key, (buckets, total, count) in sorted(self.values.items()):
+                for bound, bucket_count in zip(self.buckets, buckets):
+                    lines.append(f'{self.name}_bucket{_labels(key + (("le", _num(bound)),))} {bucket_count}')
+                lines.append(f'{self.name}_bucket{_labels(key + (("le", "+Inf"),))} {count}')
+                lines.append(f'{self.name}_sum{_labels(key)} {total}')
+                lines.append(f'{self.name}_count{_labels(key)} {count}')
+        return lines
+
+
+def _num(value):
+    return str(int(value)) if float(value).is_integer() else str(value)
+
+
+def _labels(key):
+    if not key:
+        return ''
+    parts = []
+    for name, value in key:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{name}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+http_request_duration = Histogram('http_request_duration_seconds', '路由处理耗时')
+db_queries_per_request = Histogram('db_queries_per_request', '每个请求的数据库查询次数', COUNT_BUCKETS)
+db_time_per_request = Histogram('db_time_per_request_seconds', '每个请求的数据库查询总耗时')
+db_queries = Counter('db_queries_total', '数据库查询次数（含后台任务）')
+gaode_request_duration = Histogram('gaode_request_duration_seconds', '高德地理编码接口耗时')
+gaode_requests = Counter('gaode_requests_total', '高德地理编码接口请求次数，按结果分类')
+gaode_errors = Counter('gaode_errors_total', '高德接口返回的错误，按 info 分类')
+import_rows = Counter('import_rows_total', '导入行数，按阶段分类')
+export_rows = Counter('export_rows_total', '导出行数，按格式分类')
+
+
+# ========== 数据库查询计数 ==========
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    db_queries.inc()
+    if has_request_context() and 'metrics_start' in g:
+        g.metrics_queries += 1
+        g.metrics_db_time += elapsed
+
+
+# ========== 路由耗时 ==========
+def _before_request():
+    g.metrics_start = time.perf_counter()
+    g.metrics_queries = 0
+    g.metrics_db_time = 0.0
+
+
+def _after_request(response):
+    if 'metrics_start' not in g or request.endpoint == 'metrics':
+        return response
+    endpoint = request.endpoint or 'unknown'
+    http_request_duration.observe(time.perf_counter() - g.metrics_start,
+                                  endpoint=endpoint, method=request.method, status=response.status_code)
+    db_queries_per_request.observe(g.metrics_queries, endpoint=endpoint)
+    db_time_per_request.observe(g.metrics_db_time, endpoint=endpoint)
+    return response
+
+
+def _geocode_cache_lines():
+    # 直接读 geocode_cache 的进程内计数，不查数据库
+    from app.geocode_cache import _stats, _lock as cache_lock
+    with cache_lock:
+        stats = dict(_stats)
+    lines = []
+    for key in ('hits', 'misses', 'stores', 'evicted'):
+        name = f'geocode_cache_{key}_total'
+        lines += [f'# TYPE {name} counter', f'{name} {stats[key]}']
+    total = stats['hits'] + stats['misses']
+    lines += ['# TYPE geocode_cache_hit_ratio gauge',
+              f'geocode_cache_hit_ratio {stats["hits"] / total if total else 0}']
+    return lines
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines += metric.render()
+    lines += _geocode_cache_lines()
+    return '\n'.join(lines) + '\n'
+
+
+def metrics():
+    if METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {METRICS_TOKEN}':
+        return Response('forbidden\n', status=403, mimetype='text/plain')
+    return Response(render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+def init_app(app):
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.add_url_rule('/metrics', 'metrics', metrics)
@@ -1,5 +1,26 @@
 from app import db
-from werkzeug.security import generate_password_hash, check_password_hash
+import json
+from datetime import datetime
+from sqlalchemy import DDL, event
+from sqlalchemy.dialects.mysql import LONGTEXT
+from werkzeug.security import check_password_hash
+from app.passwords import hash_password
+
+# 地理编码状态
+class GeocodeState:
+    PENDING = 0  # 未编码（新增、修改地址后）
+    OK = 1       # 成功
+    ERROR = 2    # 失败，等到 geocode_next_retry_at 后重试
+
+
+def geocode_status_text(state, error=None):
+    """地理编码状态的文字说明，与原 geocoded_status 字段的取值一致"""
+    if state == GeocodeState.OK:
+        return '成功'
+    if state == GeocodeState.ERROR:
+        return error
+    return None
+
 
 # 客户
 class Customer(db.Model):
@@ -8,15 +29,35 @@ class Customer(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
+    name_pinyin = db.Column(db.String(255))  # 姓名全拼，如 zhangsan
+    name_initials = db.Column(db.String(100))  # 姓名拼音首字母，如 zs
     phone = db.Column(db.String(64))
     address = db.Column(db.Text, nullable=False)
+    address_hash = db.Column(db.String(64))  # 归一化地址的哈希，TEXT 列无法建索引，查重用这一列
     latitude = db.Column(db.Float)
     longitude = db.Column(db.Float)
-    geocoded_status = db.Column(db.String(30))
+    geocode_state = db.Column(db.SmallInteger, nullable=False, default=GeocodeState.PENDING)
+    geocode_error = db.Column(db.String(255))  # 最近一次失败的原因
+    geocode_attempts = db.Column(db.Integer, nullable=False, default=0)  # 连续失败次数
+    geocode_next_retry_at = db.Column(db.DateTime)  # 失败后下次可以重试的时间（指数退避）
     owner_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
 
+    __table_args__ = (
+        db.Index('ix_customers_owner_id_id', 'owner_id', 'id'),
+        db.Index('ix_customers_owner_name_address_hash', 'owner_id', 'name', 'address_hash'),
+        db.Index('ix_customers_owner_lat_lng', 'owner_id', 'latitude', 'longitude'),
+        db.Index('ix_customers_owner_phone', 'owner_id', 'phone'),
+        db.Index('ix_customers_owner_name_pinyin', 'owner_id', 'name_pinyin'),
+        db.Index('ix_customers_owner_name_initials', 'owner_id', 'name_initials'),
+        db.Index('ix_customers_owner_geocode_retry', 'owner_id', 'geocode_state', 'geocode_next_retry_at'),
+    )
+
     def __repr__(self):
         return f'<Customer {self.name}>'
+
+    @property
+    def geocoded_status(self):
+        return geocode_status_text(self.geocode_state, self.geocode_error)
     
     def to_dict(self):
         return {
@@ -29,6 +70,22 @@ class Customer(db.Model):
             "geocoded_status": self.geocoded_status
         }
     
+# 全文检索对象（见 app/search.py 和迁移 4c1d91deb45c）不在模型里声明，迁移自动生成时由 migrations/env.py 排除；
+# db.create_all() 建表时在这里一并创建，否则 SQLite 下增删改客户同步 customers_fts 会失败
+FULLTEXT_INDEX = 'ft_customers_name_phone_address'
+FTS_TABLE = 'customers_fts'
+
+event.listen(Customer.__table__, 'after_create', DDL(
+    f'ALTER TABLE customers ADD FULLTEXT INDEX {FULLTEXT_INDEX} (name, phone, address) WITH PARSER ngram'
+).execute_if(dialect='mysql'))
+event.listen(Customer.__table__, 'after_create', DDL(
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(name, phone, address, tokenize='trigram')"
+).execute_if(dialect='sqlite'))
+event.listen(Customer.__table__, 'before_drop', DDL(
+    f'DROP TABLE IF EXISTS {FTS_TABLE}'
+).execute_if(dialect='sqlite'))
+
+
 # 用户
 class User(db.Model):
     __tablename__ = 'users'
@@ -36,9 +93,72 @@ class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(50), unique=True, nullable=False)
     password_hash = db.Column(db.String(256), nullable=False)
+    # 客户数据版本号，客户数据每次变更都加一，用于导出缓存等判断数据是否变化
+    data_revision = db.Column(db.Integer, nullable=False, default=0)
+    data_updated_at = db.Column(db.DateTime)
 
     def create_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
\ No newline at end of file
+        return check_password_hash(self.password_hash, password)
+
+
+# 地理编码缓存（按归一化地址哈希）
+class GeocodeCache(db.Model):
+    __tablename__ = 'geocode_cache'
+
+    id = db.Column(db.Integer, primary_key=True)
+    address_hash = db.Column(db.String(64), unique=True, nullable=False)
+    address = db.Column(db.Text, nullable=False)
+    latitude = db.Column(db.Float, nullable=False)
+    longitude = db.Column(db.Float, nullable=False)
+    formatted_address = db.Column(db.String(255))
+    level = db.Column(db.String(30))
+    adcode = db.Column(db.String(20))
+    raw = db.Column(db.Text)  # 高德返回的 geocodes[0] 原始 JSON
+    hit_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    last_hit_at = db.Column(db.DateTime, nullable=False, default=datetime.now, index=True)
+
+    def __repr__(self):
+        return f'<GeocodeCache {self.address}>'
+
+
+
+# 后台导入任务
+class ImportJob(db.Model):
+    __tablename__ = 'import_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    owner_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    filename = db.Column(db.String(255), nullable=False)
+    file_path = db.Column(db.String(500), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending/running/done/failed
+    rows_parsed = db.Column(db.Integer, nullable=False, default=0)
+    rows_inserted = db.Column(db.Integer, nullable=False, default=0)
+    rows_geocoded = db.Column(db.Integer, nullable=False, default=0)
+    rows_failed = db.Column(db.Integer, nullable=False, default=0)
+    message = db.Column(db.String(255))
+    errors = db.Column(db.Text().with_variant(LONGTEXT, 'mysql'))  # 每行错误信息的 JSON 列表
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<ImportJob {self.id} {self.status}>'
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "rows_parsed": self.rows_parsed,
+            "rows_inserted": self.rows_inserted,
+            "rows_geocoded": self.rows_geocoded,
+            "rows_failed": self.rows_failed,
+            "message": self.message,
+            "errors": json.loads(self.errors) if self.errors else [],
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
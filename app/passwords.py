@@ -0,0 +1,56 @@
+'''密码哈希
+ - 哈希方法和强度由 PASSWORD_HASH_METHOD 配置，登录时发现旧哈希参数不一致就按新参数重新哈希。
+ - 登录时的哈希计算放到有界线程池里执行，同时最多 PASSWORD_HASH_WORKERS 个哈希占用 CPU，
+   排队超过 PASSWORD_HASH_QUEUE 时直接提示繁忙，避免登录高峰拖慢其他页面。
+'''
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import check_password_hash, generate_password_hash
+from config import PASSWORD_HASH_METHOD, PASSWORD_HASH_QUEUE, PASSWORD_HASH_TIMEOUT, PASSWORD_HASH_WORKERS
+
+
+class PasswordBusyError(Exception):
+    """哈希线程池已满"""
+
+
+_executor = ThreadPoolExecutor(max_workers=max(1, PASSWORD_HASH_WORKERS), thread_name_prefix='password')
+_slots = threading.BoundedSemaphore(max(1, PASSWORD_HASH_WORKERS) + max(0, PASSWORD_HASH_QUEUE))
+
+_method_prefix = None
+
+
+def hash_password(password):
+    return generate_password_hash(password, method=PASSWORD_HASH_METHOD)
+
+
+def needs_rehash(password_hash):
+    """已保存的哈希参数和当前配置不一致时需要重新哈希"""
+    global _method_prefix
+    if _method_prefix is None:
+        # 配置里可以省略参数（如只写 scrypt），以 werkzeug 实际生成的前缀为准
+        _method_prefix = hash_password('').split('$', 1)[0]
+    return password_hash.split('$', 1)[0] != _method_prefix
+
+
+def _verify(password_hash, password):
+    if not check_password_hash(password_hash, password):
+        return False, None
+    if needs_rehash(password_hash):
+        return True, hash_password(password)
+    return True, None
+
+
+def verify_password(password_hash, password):
+    """
+    在哈希线程池里校验密码，返回 (是否正确, 新哈希)；新哈希不为 None 时调用方应保存。
+    线程池排满时抛出 PasswordBusyError。
+    """
+    if not _slots.acquire(blocking=False):
+        raise PasswordBusyError()
+    try:
+        future = _executor.submit(_verify, password_hash, password)
+    except Exception:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    return future.result(timeout=PASSWORD_HASH_TIMEOUT)
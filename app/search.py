@@ -0,0 +1,96 @@
+'''客户全文检索（姓名、手机号、地址）
+ - MySQL：customers 表 (name, phone, address) 上的 FULLTEXT 索引，使用 ngram 分词支持中文，由 MySQL 自动维护。
+ - SQLite：customers_fts FTS5 表，使用 trigram 分词（需要 SQLite 3.34+），
+   由增删改和导入路径调用 index_customers / remove_customers / index_new_customers 同步。
+ - 其他数据库、SEARCH_BACKEND=like 或关键词短于分词长度时：退回 LIKE 模糊匹配。
+ - 关键词全是英文字母时，同时按姓名拼音全拼 / 首字母前缀匹配（写入时预先算好，走 (owner_id, name_pinyin/name_initials) 索引）。
+'''
+from sqlalchemy import column, or_, text
+from config import SEARCH_BACKEND
+from app import db
+from app.models import Customer
+from app.utils import is_pinyin_keyword
+
+
+# MySQL ngram_token_size 默认为 2，FTS5 trigram 分词为 3，短于该长度的关键词无法走索引
+MIN_TOKEN_LENGTH = {'mysql': 2, 'sqlite': 3}
+
+
+def backend():
+    """当前使用的检索方式：mysql / sqlite / like"""
+    if SEARCH_BACKEND != 'auto':
+        return SEARCH_BACKEND
+    name = db.engine.dialect.name
+    return name if name in MIN_TOKEN_LENGTH else 'like'
+
+
+def _phrase(keyword, kind):
+    # 按整个短语匹配；FTS5 里双引号写两次转义，MySQL 布尔模式不支持转义，直接替换为空格
+    if kind == 'mysql':
+        return '"' + keyword.replace('"', ' ') + '"'
+    return '"' + keyword.replace('"', '""') + '"'
+
+
+def match_condition(keyword):
+    """返回匹配关键词的过滤条件，可直接用在 Customer 查询的 filter 里"""
+    condition = _text_condition(keyword)
+    if is_pinyin_keyword(keyword):
+        condition = or_(condition, pinyin_condition(keyword))
+    return condition
+
+
+def pinyin_condition(keyword):
+    """姓名拼音全拼或首字母以关键词开头"""
+    keyword = keyword.lower()
+    return or_(Customer.name_pinyin.startswith(keyword, autoescape=True),
+               Customer.name_initials.startswith(keyword, autoescape=True))
+
+
+def _text_condition(keyword):
+    kind = backend()
+    if kind in MIN_TOKEN_LENGTH and len(keyword) >= MIN_TOKEN_LENGTH[kind]:
+        if kind == 'mysql':
+            return text('MATCH (customers.name, customers.phone, customers.address) '
+                        'AGAINST (:fts_keyword IN BOOLEAN MODE)').bindparams(
+                fts_keyword=_phrase(keyword, kind))
+        return Customer.id.in_(
+            text('SELECT rowid FROM customers_fts WHERE customers_fts MATCH :fts_keyword')
+            .bindparams(fts_keyword=_phrase(keyword, kind))
+            .columns(column('rowid'))
+        )
+    return or_(Customer.name.contains(keyword),
+               Customer.phone.contains(keyword),
+               Customer.address.contains(keyword))
+
+
+def index_customers(customers):
+    """把新增或修改的客户写入检索表（只有 SQLite 需要）"""
+    if backend() != 'sqlite' or not customers:
+        return
+    db.session.flush()
+    for customer in customers:
+        db.session.execute(text('DELETE FROM customers_fts WHERE rowid = :id'), {'id': customer.id})
+        db.session.execute(
+            text('INSERT INTO customers_fts (rowid, name, phone, address) VALUES (:id, :name, :phone, :address)'),
+            {'id': customer.id, 'name': customer.name, 'phone': customer.phone or '', 'address': customer.address}
+        )
+
+
+def remove_customers(customer_ids):
+    """从检索表删除客户（只有 SQLite 需要）"""
+    if backend() != 'sqlite' or not customer_ids:
+        return
+    for customer_id in customer_ids:
+        db.session.execute(text('DELETE FROM customers_fts WHERE rowid = :id'), {'id': customer_id})
+
+
+def index_new_customers(user_id, after_id):
+    """批量导入后，把该用户 id 大于 after_id 且还没进检索表的客户写入检索表（只有 SQLite 需要）"""
+    if backend() != 'sqlite':
+        return
+    db.session.execute(text(
+        'INSERT INTO customers_fts (rowid, name, phone, address) '
+        "SELECT id, name, coalesce(phone, ''), address FROM customers "
+        'WHERE owner_id = :owner_id AND id > :after_id '
+        'AND id NOT IN (SELECT rowid FROM customers_fts WHERE rowid > :after_id)'
+    ), {'owner_id': user_id, 'after_id': after_id})
@@ -1,48 +1,178 @@
-from config import GAODE_SERVER_KEY, GAODE_SECURITY_KEY
-from urllib.parse import urlencode
-from app.utils import generate_sign, safe_str
-import requests
+from config import GEOCODE_COMMIT_BATCH_SIZE, GEOCODE_RETRY_BASE, GEOCODE_RETRY_MAX, IMPORT_CHUNK_SIZE
+from sqlalchemy import insert, select
+from app.utils import safe_str
 from app import db
-from app.models import Customer
+from app.models import Customer, GeocodeState, User, geocode_status_text
+from datetime import datetime, timedelta
+from collections import OrderedDict
 import pandas as pd
+import csv
+import logging
+import os
+import threading
+import tempfile
+import zlib
+from openpyxl import Workbook
 from io import StringIO, BytesIO
 from app import utils
+from app import geocode_cache
+from app import geocoder
+from app import search
+from app import metrics
 
 
-def get_customer_paginate(user_id,page=1, per_page=10):
-    """获取客户分页数据"""
-    pagination = Customer.query.filter_by(owner_id=user_id).paginate(page=page, 
-                                                                     per_page=per_page, 
-                                                                     error_out=False
-                                                                    )
-    return pagination
+logger = logging.getLogger(__name__)
 
 
+# 客户总数缓存条数
+COUNT_CACHE_SIZE = 1024
+_count_cache = OrderedDict()
+_count_lock = threading.Lock()
 
-def get_customer_data(user_id):
-    """获取当前登录用户的客户数据"""
-    customers = Customer.query.filter_by(owner_id=user_id).all()
+# 输入联想缓存条数、单次最多返回条数
+SUGGEST_CACHE_SIZE = 2048
+SUGGEST_MAX_LIMIT = 20
+_suggest_cache = OrderedDict()
+_suggest_lock = threading.Lock()
+
+# 批量查重时每次 IN 查询的键数量
+DUPLICATE_QUERY_CHUNK = 500
+# 导入文件中可以作为手机号的列
+PHONE_COLUMNS = ('手机号', '手机', '电话')
+
+
+def bump_data_revision(user_id):
+    """客户数据版本号加一，和数据变更放在同一个事务里提交"""
+    User.query.filter_by(id=user_id).update(
+        {User.data_revision: User.data_revision + 1, User.data_updated_at: datetime.now()},
+        synchronize_session=False)
+
+
+def get_data_revision(user_id):
+    """获取客户数据版本号和最后修改时间，只查 users 主键"""
+    row = db.session.query(User.data_revision, User.data_updated_at).filter(User.id == user_id).first()
+    if row is None:
+        return 0, None
+    return row.data_revision or 0, row.data_updated_at
+
+
+def get_customer_page(user_id, after=None, before=None, start=1, per_page=10, revision=None):
+    """keyset 分页获取客户列表
+        1. 按 (owner_id, id) 索引定位，after 取 id 更大的下一页，before 取 id 更小的上一页，不用 OFFSET，翻到多深都一样快
+        2. 多取一条判断是否还有下一页（上一页），不执行 COUNT(*)
+        3. start 为本页第一条的序号，由翻页链接带过来，用于显示编号
+        4. 总数按 (用户, 数据版本号) 缓存，数据不变时不再 COUNT；revision 为调用方已取到的数据版本号，不传时查一次
+    """
+    query = Customer.query.filter(Customer.owner_id == user_id)
+    if before is not None:
+        rows = query.filter(Customer.id < before).order_by(Customer.id.desc()).limit(per_page + 1).all()
+        has_prev = len(rows) > per_page
+        items = rows[:per_page][::-1]
+        has_next = True
+        if not has_prev:
+            start = 1
+    else:
+        if after is not None:
+            query = query.filter(Customer.id > after)
+        rows = query.order_by(Customer.id).limit(per_page + 1).all()
+        has_next = len(rows) > per_page
+        items = rows[:per_page]
+        has_prev = after is not None
+
+    start = max(1, start)
+    return {
+        "items": items,
+        "start": start,
+        "per_page": per_page,
+        "has_prev": has_prev and bool(items),
+        "has_next": has_next and bool(items),
+        "prev_cursor": items[0].id if items else None,
+        "next_cursor": items[-1].id if items else None,
+        "prev_start": max(1, start - per_page),
+        "next_start": start + len(items),
+        "total": count_customers(user_id, revision),
+    }
+
+
+def count_customers(user_id, revision=None):
+    """客户总数，按 (用户, 数据版本号) 缓存在进程内；revision 不传时查一次数据版本号"""
+    if revision is None:
+        revision, _ = get_data_revision(user_id)
+    key = (user_id, revision)
+    with _count_lock:
+        if key in _count_cache:
+            _count_cache.move_to_end(key)
+            return _count_cache[key]
+
+    total = Customer.query.filter(Customer.owner_id == user_id).count()
+    with _count_lock:
+        _count_cache[key] = total
+        while len(_count_cache) > COUNT_CACHE_SIZE:
+            _count_cache.popitem(last=False)
+    return total
+
+
+def _bbox_conditions(bbox):
+    """视野范围过滤条件，bbox=(最小经度, 最小纬度, 最大经度, 最大纬度)"""
+    min_lng, min_lat, max_lng, max_lat = bbox
+    return [Customer.latitude.between(min_lat, max_lat),
+            Customer.longitude.between(min_lng, max_lng)]
+
+
+def get_customer_data(user_id, bbox=None, limit=None):
+    """获取当前登录用户的客户数据
+        传入 bbox=(最小经度, 最小纬度, 最大经度, 最大纬度) 时只返回视野内的客户，
+        走 (owner_id, latitude, longitude) 索引，最多返回 limit 条
+    """
+    query = Customer.query.filter_by(owner_id=user_id)
+    if bbox is not None:
+        query = query.filter(*_bbox_conditions(bbox))
+    if limit:
+        query = query.limit(limit)
+    customers = query.all()
     return customers
+
+
+def get_customer_columns(user_id, bbox=None, limit=None):
+    """列式地图数据：只查有坐标客户的 id/纬度/经度/姓名 四列，返回平行数组，地址和电话点击时再按 id 加载"""
+    stmt = select(Customer.id, Customer.latitude, Customer.longitude, Customer.name).where(
+        Customer.owner_id == user_id,
+        Customer.latitude.isnot(None),
+        Customer.longitude.isnot(None))
+    if bbox is not None:
+        stmt = stmt.where(*_bbox_conditions(bbox))
+    if limit:
+        stmt = stmt.limit(limit)
+
+    columns = {'id': [], 'lat': [], 'lng': [], 'name': []}
+    for customer_id, lat, lng, name in db.session.execute(stmt):
+        columns['id'].append(customer_id)
+        columns['lat'].append(lat)
+        columns['lng'].append(lng)
+        columns['name'].append(name)
+    return columns
  
 
 
-def validate_duplicate(name,phone,address,customer_id=None):
-    '''验证客户是否存在
-        1. 验证客户名称和地址是否重复
+def validate_duplicate(name,phone,address,user_id,customer_id=None):
+    '''验证当前用户下客户是否存在
+        1. 验证客户名称和地址是否重复（按归一化地址哈希走索引）
         2. 验证客户手机号是否重复
     '''
 
     errors = []
 
     if name and address:
-        customer = Customer.query.filter(Customer.name==name,Customer.address==address)
+        customer = Customer.query.filter(Customer.owner_id==user_id,
+                                         Customer.name==name,
+                                         Customer.address_hash==utils.address_hash(address))
         if customer_id:
             customer = customer.filter(Customer.id != customer_id)
         if customer.first():
             errors.append('该客户已存在！姓名和地址相同！') 
         
     if phone:
-        customer = Customer.query.filter(Customer.phone==phone)
+        customer = Customer.query.filter(Customer.owner_id==user_id, Customer.phone==phone)
         if customer_id:
             customer = customer.filter(Customer.id != customer_id)
         if customer.first():
@@ -50,6 +180,58 @@ def validate_duplicate(name,phone,address,customer_id=None):
     return errors
 
 
+def find_import_duplicates(rows, user_id):
+    '''导入前批量查重，返回 {行号: 错误信息}
+        1. 只按文件里出现的键分块查询当前用户已有的 (姓名, 地址哈希) 和手机号，几次查询完成
+        2. 同一文件内重复的行，以第一次出现的行为准
+    '''
+    errors = {}
+    keys = {}
+    for row_num, data in rows:
+        if not data['name'] or not data['address']:
+            errors[row_num] = '姓名和地址不能为空！'
+            continue
+        keys[row_num] = (data['name'], utils.address_hash(data['address']), data['phone'])
+
+    hashes = list({key[1] for key in keys.values()})
+    phones = list({key[2] for key in keys.values() if key[2]})
+    existing_pairs = set()
+    existing_phones = set()
+    for i in range(0, len(hashes), DUPLICATE_QUERY_CHUNK):
+        existing_pairs.update(
+            db.session.query(Customer.name, Customer.address_hash)
+                      .filter(Customer.owner_id == user_id,
+                              Customer.address_hash.in_(hashes[i:i + DUPLICATE_QUERY_CHUNK]))
+        )
+    for i in range(0, len(phones), DUPLICATE_QUERY_CHUNK):
+        existing_phones.update(
+            phone for (phone,) in db.session.query(Customer.phone)
+                                            .filter(Customer.owner_id == user_id,
+                                                    Customer.phone.in_(phones[i:i + DUPLICATE_QUERY_CHUNK]))
+        )
+
+    seen_pairs = {}
+    seen_phones = {}
+    for row_num, (name, hash_, phone) in keys.items():
+        row_errors = []
+        if (name, hash_) in existing_pairs:
+            row_errors.append('该客户已存在！姓名和地址相同！')
+        elif (name, hash_) in seen_pairs:
+            row_errors.append(f'与第{seen_pairs[(name, hash_)]}行姓名和地址相同！')
+        if phone:
+            if phone in existing_phones:
+                row_errors.append('该客户已存在！手机号相同！')
+            elif phone in seen_phones:
+                row_errors.append(f'与第{seen_phones[phone]}行手机号相同！')
+
+        if row_errors:
+            errors[row_num] = ";".join(row_errors)
+            continue
+        seen_pairs[(name, hash_)] = row_num
+        if phone:
+            seen_phones[phone] = row_num
+    return errors
+
 
 def add_customer_data(name, phone, address, user_id):
     """添加客户"""
@@ -59,16 +241,22 @@ def add_customer_data(name, phone, address, user_id):
         raise ValueError("手机号格式不正确！")
     
     # 验证客户是否存在
-    duplicate_errors = validate_duplicate(name,phone,address)
+    duplicate_errors = validate_duplicate(name,phone,address,user_id)
     if duplicate_errors:
         raise ValueError(";".join(duplicate_errors))
+    name_pinyin, name_initials = utils.name_pinyin(name)
     customer = Customer(name=name, 
+                        name_pinyin=name_pinyin,
+                        name_initials=name_initials,
                         phone=phone or None, 
                         address=address,
+                        address_hash=utils.address_hash(address),
                         owner_id=user_id)
     try:
         db.session.add(customer)
         geocode_customer(customer)
+        search.index_customers([customer])
+        bump_data_revision(user_id)
         db.session.commit()
         return True	
     except Exception as e:
@@ -94,7 +282,7 @@ def update_customer_data(customer_id, name, phone, address, user_id):
     if customer is None:
         return None
     # 验证客户是否存在
-    duplicate_errors = validate_duplicate(name,phone,address,customer_id)
+    duplicate_errors = validate_duplicate(name,phone,address,user_id,customer_id)
     if duplicate_errors:
         raise ValueError(",".join(duplicate_errors))
 
@@ -105,16 +293,21 @@ def update_customer_data(customer_id, name, phone, address, user_id):
 
         # 如果地址发生变化，重置地理编码状态
     if customer.address != address:
-        customer.geocoded_status = None
+        _reset_geocode(customer)
 
     # 更新客户信息
+    if customer.name != name:
+        customer.name_pinyin, customer.name_initials = utils.name_pinyin(name)
     customer.name = name
     customer.phone = phone
     customer.address = address
+    customer.address_hash = utils.address_hash(address)
 
     try:
-        if customer.geocoded_status is None:
+        if customer.geocode_state == GeocodeState.PENDING:
             geocode_customer(customer,force=True)
+        search.index_customers([customer])
+        bump_data_revision(user_id)
         db.session.commit()
         return True
     except Exception:
@@ -131,6 +324,8 @@ def delete_customer(customer_id,user_id):
         return False
     try:
         db.session.delete(customer)
+        search.remove_customers([customer.id])
+        bump_data_revision(user_id)
         db.session.commit()
         return True
     except Exception:
@@ -139,33 +334,93 @@ def delete_customer(customer_id,user_id):
 
 
 
-def search_customer(user_id,keyword=None):
+def search_customer(user_id, keyword=None, page=1, per_page=20):
     """搜索客户
-        id存字典 避免重复查询数据库获取index
+        编号（客户在列表中的位置）只对当前页计算：第一条的位置 COUNT 一次，
+        其余各条加上与前一条之间的客户数，只扫描本页首尾 id 之间的 (owner_id, id) 索引
     """
     if not keyword:
         return {
             "customers_data": [],
-            "count": 0
+            "count": 0,
+            "page": 1,
+            "pages": 0
         }
-    else:
-        all_customers = Customer.query.filter(Customer.owner_id == user_id).order_by(Customer.id).all()
-        id_to_index = {}
-        for i, customer in enumerate(all_customers,start=1):
-            id_to_index[customer.id] = i
-
-        customers = Customer.query.filter((Customer.name.contains(keyword)) | 
-                                          (Customer.phone.contains(keyword)), 
-                                          Customer.owner_id == user_id).order_by(Customer.id).all()
-        customers_data = []
-        for customer in customers:
-            index = id_to_index[customer.id]
-            customers_data.append({
-                'index': index,
-                'customer': customer.to_dict(),
-            })
-        return {"customers_data": customers_data,
-                "count": len(customers)}
+
+    query = Customer.query.filter(search.match_condition(keyword), Customer.owner_id == user_id)
+    total = query.count()
+    pages = (total + per_page - 1) // per_page
+    page = min(max(1, page), max(1, pages))
+
+    customers = (query.order_by(Customer.id)
+                      .offset((page - 1) * per_page)
+                      .limit(per_page)
+                      .all())
+    positions = _customer_positions(user_id, [customer.id for customer in customers])
+
+    customers_data = [{'index': index, 'customer': customer.to_dict()}
+                      for customer, index in zip(customers, positions)]
+    return {"customers_data": customers_data,
+            "count": total,
+            "page": page,
+            "pages": pages}
+
+
+def _customer_positions(user_id, ids):
+    """按 id 升序的 ids 在该用户全部客户中按 id 排序的位置，等价于 ROW_NUMBER() OVER (ORDER BY id)"""
+    if not ids:
+        return []
+    first = (db.session.query(db.func.count(Customer.id))
+             .filter(Customer.owner_id == user_id, Customer.id <= ids[0])
+             .scalar())
+    if len(ids) == 1:
+        return [first]
+    # (ids[0], ids[i]] 之间的客户数，一次扫描同时算出
+    gaps = (db.session.query(*[db.func.coalesce(db.func.sum(db.case((Customer.id <= customer_id, 1), else_=0)), 0)
+                               for customer_id in ids[1:]])
+            .filter(Customer.owner_id == user_id, Customer.id > ids[0], Customer.id <= ids[-1])
+            .one())
+    return [first] + [first + gap for gap in gaps]
+
+
+def suggest_customers(user_id, prefix, limit=10, revision=None):
+    """搜索框输入联想：返回姓名或手机号以 prefix 开头的前 limit 个客户
+        1. 前缀匹配 LIKE 'xx%' 走 (owner_id, name) / (owner_id, phone) 索引，按索引顺序取前 limit 条即停
+        2. 只有全是数字的前缀才查手机号，只有全是字母的前缀才查拼音
+        3. 结果按 (用户, 数据版本号, 前缀, 条数) 缓存在进程内 LRU 中；revision 为调用方已取到的数据版本号，不传时查一次
+    """
+    prefix = (prefix or '').strip()
+    if not prefix:
+        return []
+    limit = max(1, min(limit, SUGGEST_MAX_LIMIT))
+
+    if revision is None:
+        revision, _ = get_data_revision(user_id)
+    key = (user_id, revision, prefix, limit)
+    with _suggest_lock:
+        if key in _suggest_cache:
+            _suggest_cache.move_to_end(key)
+            return _suggest_cache[key]
+
+    query = db.session.query(Customer.id, Customer.name, Customer.phone, Customer.address) \
+                      .filter(Customer.owner_id == user_id)
+    rows = query.filter(Customer.name.startswith(prefix, autoescape=True)) \
+                .order_by(Customer.name).limit(limit).all()
+    if len(rows) < limit and prefix.isdigit():
+        seen = [row.id for row in rows]
+        rows += query.filter(Customer.phone.startswith(prefix, autoescape=True), Customer.id.notin_(seen)) \
+                     .order_by(Customer.phone).limit(limit - len(rows)).all()
+    if len(rows) < limit and utils.is_pinyin_keyword(prefix):
+        seen = [row.id for row in rows]
+        rows += query.filter(search.pinyin_condition(prefix), Customer.id.notin_(seen)) \
+                     .order_by(Customer.name_pinyin).limit(limit - len(rows)).all()
+
+    result = [{'id': row.id, 'name': row.name, 'phone': row.phone, 'address': row.address} for row in rows]
+    with _suggest_lock:
+        _suggest_cache[key] = result
+        while len(_suggest_cache) > SUGGEST_CACHE_SIZE:
+            _suggest_cache.popitem(last=False)
+    return result
 
 
 # 调用高德地图 API
@@ -173,201 +428,160 @@ def geocode_customer(customer, force=False):
     """
     调用高德地图 API 进行地址转坐标。
     """
-    print(f"\n=== 开始地理编码: {customer.name} ===")
-    print(f"地址: {customer.address}")
-    print(f"当前状态: {customer.geocoded_status}")
-    print(f"force: {force}")
-
-    # 非强制模式下，如果已经成功获取坐标或有明确错误状态，则不再尝试调用API
-    if not force:
-        if customer.geocoded_status == '成功' and customer.latitude and customer.longitude:
-            return True
-        if customer.geocoded_status and customer.geocoded_status not in ['api错误', '请求失败', '未配置密钥']:
-            return True
+    logger.debug("开始地理编码 customer=%s address=%s status=%s force=%s",
+                 customer.name, customer.address, customer.geocoded_status, force)
+
+    # 已经成功获取坐标，不再调用API
+    if customer.geocode_state == GeocodeState.OK and customer.latitude and customer.longitude:
+        return True
 
     # 非强制模式下，如果已经有坐标，也不再调用API
     if customer.latitude and customer.longitude and not force:
-        customer.geocoded_status = '成功'
-        return True
-    
-    # 强制模式下，如果已经成功获取坐标，则不再尝试调用API
-    if force and customer.geocoded_status == '成功' and customer.latitude and customer.longitude:
+        customer.geocode_state = GeocodeState.OK
         return True
 
 
-    api_key = GAODE_SERVER_KEY
-    security_key = GAODE_SECURITY_KEY
+    # 先查地理编码缓存，命中则不再调用高德 API
+    cached = geocode_cache.lookup(customer.address)
+    if cached is not None:
+        logger.debug("命中地理编码缓存 address=%s", cached.formatted_address or cached.address)
+        apply_geocode_result(customer, {'ok': True,
+                                        'latitude': cached.latitude,
+                                        'longitude': cached.longitude,
+                                        'status': '成功'})
+        return True
 
-    if not api_key:
-        customer.geocoded_status = '未配置密钥'
+    result = geocoder.request_geocode(customer.address)
+    if not apply_geocode_result(customer, result):
         return False
 
-    # 基础参数
-    params = {
-        'address': customer.address or '',
-        'key': api_key,
-        'output': 'json'
-    }
-    
-    # 带密钥请求
-    if security_key:
-        sig = generate_sign(params, security_key)
-        params_with_sig = params.copy()
-        params_with_sig['sig'] = sig
-        
-        # 构建请求URL（需要对参数进行URL编码）
-        encoded_params = urlencode(params_with_sig, doseq=True)
-        final_url = f"https://restapi.amap.com/v3/geocode/geo?{encoded_params}"
-        
-        print(f"最终请求URL（签名已屏蔽）: {final_url.replace(sig, '***')}")
-        
-        try:
-            resp = requests.get(final_url, timeout=8)
-            print("响应状态码:", resp.status_code)
-            print("响应内容:", resp.text[:500])
-            
-            resp.raise_for_status()
-            data = resp.json()
-
-            if str(data.get('status')) == '1' and data.get('geocodes'):
-                location = data['geocodes'][0].get('location', '')
-                if location:
-                    lng, lat = location.split(',')
-                    customer.latitude = float(lat)
-                    customer.longitude = float(lng)
-                    customer.geocoded_status = '成功'
-                    return True
-                else:
-                    customer.geocoded_status = 'api错误：未返回location'
-                    return False
-            else:
-                info = data.get('info', '')
-                customer.geocoded_status = f"api错误：{safe_str(info)}"
-                return False
-
-        except Exception as e:
-            err = safe_str(e)
-            print(f"请求异常: {err}")
-            customer.geocoded_status = f'请求失败：{err}'
-            return False
+    if geocoder.results_cacheable():
+        geocode_cache.store(customer.address, customer.latitude, customer.longitude, result['geocode'])
+    return True
 
-    else:
-        # 没有安全密钥的情况
-        encoded_params = urlencode(params, doseq=True)
-        final_url = f"https://restapi.amap.com/v3/geocode/geo?{encoded_params}"
-        print(f"无签名请求URL: {final_url}")
-        
-        try:
-            resp = requests.get(final_url, timeout=8)
-            resp.raise_for_status()
-            data = resp.json()
-
-            if str(data.get('status')) == '1' and data.get('geocodes'):
-                location = data['geocodes'][0].get('location', '')
-                if location:
-                    lng, lat = location.split(',')
-                    customer.latitude = float(lat)
-                    customer.longitude = float(lng)
-                    customer.geocoded_status = '成功'
-                    return True
-            else:
-                info = data.get('info', '')
-                customer.geocoded_status = f"api错误：{safe_str(info)}"
-                return False
-                
-        except Exception as e:
-            err = safe_str(e)
-            customer.geocoded_status = f'请求失败：{err}'
-            return False
-
-    return False
 
+def apply_geocode_result(customer, result):
+    """把地理编码结果写回客户，返回是否成功"""
+    for key, value in _geocode_fields(result, customer.geocode_attempts or 0).items():
+        setattr(customer, key, value)
+    return result['ok']
 
-def try_again_geocode(user_id):
-    """重试对失败的客户进行地理编码"""
 
+def _geocode_fields(result, attempts=0):
+    """地理编码结果对应的客户字段；失败时累加失败次数，并按指数退避算出下次重试时间"""
+    if result['ok']:
+        return {'latitude': result['latitude'],
+                'longitude': result['longitude'],
+                'geocode_state': GeocodeState.OK,
+                'geocode_error': None,
+                'geocode_attempts': 0,
+                'geocode_next_retry_at': None}
+    attempts += 1
+    delay = min(GEOCODE_RETRY_BASE * 2 ** min(attempts - 1, 30), GEOCODE_RETRY_MAX)
+    return {'geocode_state': GeocodeState.ERROR,
+            'geocode_error': (result['status'] or '')[:255],
+            'geocode_attempts': attempts,
+            'geocode_next_retry_at': datetime.now() + timedelta(seconds=delay)}
+
+
+def _reset_geocode(customer):
+    """地址变化后回到未编码状态"""
+    customer.geocode_state = GeocodeState.PENDING
+    customer.geocode_error = None
+    customer.geocode_attempts = 0
+    customer.geocode_next_retry_at = None
+
+
+def try_again_geocode(user_id):
+    """重试对失败的客户进行地理编码
+        按 (owner_id, geocode_state, geocode_next_retry_at) 索引范围读取：未编码的客户，以及退避时间已到的失败客户
+    """
+    now = datetime.now()
     to_retry = Customer.query.filter(
         Customer.owner_id == user_id,
-        (Customer.geocoded_status.is_(None)) |
-        (Customer.geocoded_status == '已存在坐标') |
-        (Customer.geocoded_status == '未配置密钥') |
-        (Customer.geocoded_status.startswith('api错误')) |
-        (Customer.geocoded_status.startswith('请求失败'))
+        (Customer.geocode_state == GeocodeState.PENDING) |
+        ((Customer.geocode_state == GeocodeState.ERROR) &
+         (Customer.geocode_next_retry_at.is_(None) | (Customer.geocode_next_retry_at <= now)))
     ).all()
     
+    # 并发请求高德，结果在当前线程按批写回数据库
+    results = geocoder.geocode_addresses([customer.address for customer in to_retry])
+
     success_count = 0
-    for customer in to_retry:
-        try:
-            if geocode_customer(customer, force=True):
-                success_count += 1
-                db.session.commit()
+    for i, customer in enumerate(to_retry, start=1):
+        result = results.get(customer.address)
+        if result is not None and apply_geocode_result(customer, result):
+            success_count += 1
+        if i % GEOCODE_COMMIT_BATCH_SIZE == 0:
+            _commit_geocode_batch(user_id)
+    if to_retry:
+        _commit_geocode_batch(user_id)
 
-        except Exception as e:
-            db.session.rollback()
-            print(f"重试客户 {customer.name} 时发生异常: {safe_str(e)}")
     return {
         "total": len(to_retry),
         "success_count": success_count
     }
 
 
+def _customer_mapping(data, user_id, result, pinyin=(None, None)):
+    """导入用的一行客户数据，带上已经算好的地理编码结果和姓名拼音"""
+    mapping = dict(data,
+                   name_pinyin=pinyin[0],
+                   name_initials=pinyin[1],
+                   phone=data['phone'] or None,
+                   address_hash=utils.address_hash(data['address']),
+                   owner_id=user_id,
+                   latitude=None,
+                   longitude=None,
+                   geocode_state=GeocodeState.PENDING,
+                   geocode_error=None,
+                   geocode_attempts=0,
+                   geocode_next_retry_at=None)
+    if result is not None:
+        mapping.update(_geocode_fields(result))
+    return mapping
+
+
+def _cell_str(value):
+    """表格单元格转字符串：空值转为空字符串，Excel 里被读成浮点数的整数（如手机号）去掉 .0"""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _commit_geocode_batch(user_id=None):
+    """提交地理编码结果；传了 user_id 说明客户数据有变化，同时更新数据版本号"""
+    try:
+        if user_id is not None:
+            bump_data_revision(user_id)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error("批量保存地理编码结果时发生异常: %s", safe_str(e))
+
 
-def read_excel_to_db(file, user_id):
+
+def read_excel_to_db(file, user_id, progress=None, filename=None):
     """
     读取Excel文件，并将客户数据保存到数据库中。
+    file 可以是上传的文件对象或文件路径，传路径时需同时传 filename 用于判断格式；
+    progress 为进度回调，参数为 parsed/inserted/geocoded/failed 四个计数。
     当前实现说明：
-    - 每条数据逐条处理并提交数据库（db.session.commit()）。
-    - 每条数据独立调用高德地图 API 进行地理编码。
-    - 优点：逻辑简单，易于理解和调试。
-    - 缺点：
-        1. 性能较低，尤其是数据量较大时（如几千条），逐条提交会导致大量数据库 I/O 开销。
-        2. 高德 API 调用频繁，容易触发限流，且无法复用已解析的地址结果。
-    
-    未来优化方向（适用于大数据量场景）：
-    1. 批量提交优化：
-        - 将多条数据累积后一次性提交数据库（例如每20条提交一次），减少 commit 次数。
-        - 示例伪代码：
-            batch_size = 20
-            customers_to_add = []
-            for customer in customers:
-                customers_to_add.append(customer)
-                if len(customers_to_add) >= batch_size:
-                    db.session.add_all(customers_to_add)
-                    db.session.commit()
-                    customers_to_add.clear()
-    
-    2. 缓存机制优化：
-        - 引入地址缓存，避免重复调用高德 API。
-        - 示例伪代码：
-            address_cache = {}
-            if customer.address in address_cache:
-                lat, lng = address_cache[customer.address]
-                customer.latitude = lat
-                customer.longitude = lng
-            else:
-                geocode_customer(customer)
-                address_cache[customer.address] = (customer.latitude, customer.longitude)
-    
-    3. 并发处理优化：
-        - 使用多线程或异步方式并发调用高德 API，提高处理速度。
-        - 注意控制并发数，避免触发 API 限流。
-        - 示例伪代码：
-            from concurrent.futures import ThreadPoolExecutor
-            with ThreadPoolExecutor(max_workers=5) as executor:
-                futures = [executor.submit(geocode_customer_cached, customer) for customer in customers]
-                for future in futures:
-                    future.result()
-    
-    4. 技术栈升级：
+    - 先读取全部行，对不重复的地址批量查询地理编码缓存，未命中的交给线程池并发请求高德（按 GEOCODE_QPS 限流）。
+    - 按 (姓名, 地址哈希) 和手机号批量查重，已存在的客户和文件内重复的行记为失败。
+    - 按 IMPORT_CHUNK_SIZE 分块批量插入（executemany），每块一个事务。
+    - 某一块插入失败时，改为逐行用保存点重试，单行失败不影响同一块里的其他行。
+
+    未来优化方向：
+    1. 技术栈升级：
         - 后续计划重构为 FastAPI 框架，利用其异步特性进一步提升性能。
         - FastAPI 支持 async/await，可结合 aiohttp 实现异步 HTTP 请求。
-    
-    适用场景：
-    - 当前实现适合数据量较小（几百条）的场景。
-    - 若数据量超过1000条，建议采用上述优化方案。
     """
+    filename = filename or file.filename
     try:
-        if file.filename.endswith('.csv'):
+        if filename.endswith('.csv'):
             df = pd.read_csv(file)
         else:
             df = pd.read_excel(file)
@@ -389,28 +603,85 @@ def read_excel_to_db(file, user_id):
         }
 
 
-    success_count = 0
-    fail_count = 0
-    error_msgs = []
-    row_num = 1
+    rows = []
     for i, row in df.iterrows():
         row_num  = i + 2 # 加2是因为i从0开始，且Excel第一行是表头 真实数据从第二行开始
+        rows.append((row_num, {
+            'name': _cell_str(row['姓名']),
+            # 手机号列可以是“手机号”、“手机”或“电话”，取第一个有值的列，都没有则为空
+            'phone': next((v for v in (_cell_str(row.get(c)) for c in PHONE_COLUMNS) if v), ''),
+            'address': _cell_str(row['地址']), # 地址必须存在
+        }))
+
+    # 批量查重：已存在的客户和文件内重复的行直接记为失败，不再地理编码和插入
+    duplicate_errors = find_import_duplicates(rows, user_id)
+    error_msgs = [f"第{row_num}行失败: {duplicate_errors[row_num]}"
+                  for row_num, _ in rows if row_num in duplicate_errors]
+    fail_count = len(duplicate_errors)
+    rows_to_insert = [(row_num, data) for row_num, data in rows if row_num not in duplicate_errors]
+
+    counts = {'parsed': len(rows), 'inserted': 0, 'geocoded': 0, 'failed': fail_count}
+    if progress:
+        progress(**counts)
+
+    # 先对所有不重复的地址并发地理编码，命中缓存的地址不再请求高德
+    results = geocoder.geocode_addresses([data['address'] for _, data in rows_to_insert])
+    _commit_geocode_batch()  # 先保存缓存记录，避免后面某行失败回滚时一起丢掉
+    counts['geocoded'] = sum(1 for _, data in rows_to_insert
+                             if results.get(data['address'], {}).get('ok'))
+    if progress:
+        progress(**counts)
+
+    # 姓名拼音按去重后的姓名一次算好，同名客户不重复转换
+    pinyin = {name: utils.name_pinyin(name) for name in {data['name'] for _, data in rows_to_insert}}
+
+    # 批量插入拿不到新 id，记下导入前的最大 id，插入后按 id 范围同步检索表
+    last_id = db.session.scalar(select(db.func.coalesce(db.func.max(Customer.id), 0))
+                                .where(Customer.owner_id == user_id))
+
+    success_count = 0
+    chunk_size = max(1, IMPORT_CHUNK_SIZE)
+    for start in range(0, len(rows_to_insert), chunk_size):
+        chunk = [(row_num, _customer_mapping(data, user_id, results.get(data['address']), pinyin[data['name']]))
+                 for row_num, data in rows_to_insert[start:start + chunk_size]]
         try:
-            customer = Customer(
-                name=row['姓名'],
-                phone=row.get('手机号') or row.get('手机') or row.get('电话') or '', # 手机号列可以是“手机号”或“手机”，如果都没有则默认为空字符串
-                address=row['地址'], # 地址必须存在
-                owner_id=user_id,
-            )
-            db.session.add(customer)
-            geocode_customer(customer)
-            db.session.commit()   # 每条数据单独提交，确保即使部分数据有问题也能保存其他数据
-            success_count += 1
-        except Exception as e:
+            # 整块一次 executemany，一个事务
+            db.session.execute(insert(Customer), [mapping for _, mapping in chunk])
+            search.index_new_customers(user_id, last_id)
+            bump_data_revision(user_id)
+            db.session.commit()
+            success_count += len(chunk)
+        except Exception:
             db.session.rollback()
-            fail_count += 1
-            error_msgs.append(f"第{row_num}行失败: {safe_str(e)}")
-        row_num += 1
+            # 整块失败时逐行用保存点重试，确保即使部分数据有问题也能保存其他数据
+            saved = []
+            for row_num, mapping in chunk:
+                try:
+                    with db.session.begin_nested():
+                        db.session.execute(insert(Customer), [mapping])
+                    saved.append(row_num)
+                except Exception as e:
+                    fail_count += 1
+                    error_msgs.append(f"第{row_num}行失败: {safe_str(e)}")
+            try:
+                if saved:
+                    search.index_new_customers(user_id, last_id)
+                    bump_data_revision(user_id)
+                db.session.commit()
+                success_count += len(saved)
+            except Exception as e:
+                db.session.rollback()
+                fail_count += len(saved)
+                error_msgs.extend(f"第{row_num}行失败: {safe_str(e)}" for row_num in saved)
+        if progress:
+            progress(**dict(counts, inserted=success_count, failed=fail_count))
+
+    metrics.import_rows.inc(counts['parsed'], stage='parsed')
+    metrics.import_rows.inc(success_count, stage='inserted')
+    metrics.import_rows.inc(counts['geocoded'], stage='geocoded')
+    metrics.import_rows.inc(fail_count, stage='failed')
+    logger.info("导入完成 user_id=%s parsed=%d inserted=%d geocoded=%d failed=%d",
+                user_id, counts['parsed'], success_count, counts['geocoded'], fail_count)
     return {
         'code': 0,
         'msg': f'成功导入数据{success_count}条数据，失败{fail_count}条数据。',
@@ -425,41 +696,18 @@ def read_excel_to_db(file, user_id):
 # 导出数据
 '''根据用户ID导出客户数据，支持CSV、XLSX和XLS格式
  当前实现说明：
-    - 查询当前用户的所有客户数据并构建DataFrame。
-    - 根据指定格式（CSV/XLSX/XLS）将数据写入内存缓冲区并返回。
-    - 优点：逻辑清晰，易于维护；支持多种常见文件格式。
+    - CSV：iter_customers_csv 生成器用服务端游标按 EXPORT_YIELD_PER 分批读取，边读边编码输出到响应，
+      内存占用不随客户数量增长；可选 gzip 压缩。
+    - XLSX：write_customers_xlsx 用 openpyxl 只写模式逐行写入临时文件，再用 send_file 返回，内存占用恒定；
+      ?geo=1 时追加经纬度和地理编码状态列。
+    - XLS：查询当前用户的所有客户数据并构建DataFrame，写入内存缓冲区并返回。
     - 缺点：
-        1. 数据量较大时可能导致内存溢出（如导出上万条记录）。
+        1. XLS 数据量较大时可能导致内存溢出（如导出上万条记录）。
         2. 不支持用户自定义筛选条件（如按时间范围或关键词过滤）。
-        3. 未对导出过程进行异步处理，可能影响性能。
-        4. 缺乏导出进度反馈机制，用户体验较差。
 
     未来优化方向（适用于大数据量或复杂需求场景）：
 
-    1. 分页导出优化：
-        - 对大数据量采用分页查询方式，避免一次性加载所有数据到内存。
-        - 示例伪代码：
-            page = 1
-            per_page = 1000
-            while True:
-                customers = Customer.query.filter_by(owner_id=user_id).paginate(page=page, per_page=per_page)
-                if not customers.items:
-                    break
-                # 处理当前页数据
-                process_customers(customers.items)
-                page += 1
-
-    2. 流式响应支持：
-        - 使用流式写入技术（如生成器）逐步输出文件内容，降低内存占用。
-        - 示例伪代码：
-            def generate_csv_stream(customers):
-                yield "姓名,手机号,地址\\n"
-                for customer in customers:
-                    yield f"{customer.name},{customer.phone},{customer.address}\\n"
-
-            return StreamingResponse(generate_csv_stream(customers), media_type="text/csv")
-
-    3. 用户自定义筛选条件：
+    1. 用户自定义筛选条件：
         - 支持用户传入筛选参数（如起止日期、客户名称关键词等）。
         - 示例伪代码：
             filters = {
@@ -473,25 +721,84 @@ def read_excel_to_db(file, user_id):
             if filters.get('keyword'):
                 query = query.filter(Customer.name.contains(filters['keyword']))
 
-    4. 异步处理与性能优化：
+    2. 异步处理与性能优化：
         - 结合FastAPI框架，使用异步数据库查询和文件写入提升性能。
-        - 示例伪代码：
-            async def async_output_excel(format, user_id):
-                customers = await db.execute(select(Customer).where(Customer.owner_id == user_id))
-                ...
-
-    5. 文件压缩与传输优化：
-        - 对大文件自动启用压缩（如ZIP格式），减少传输时间和存储空间。
-        - 示例伪代码：
-            import zipfile
-            with zipfile.ZipFile(output_zip, 'w') as zf:
-                zf.writestr("customers.csv", csv_content)
-    
-    适用场景：
-    - 当前实现适合数据量较小（几百条以内）且无需高级筛选功能的场景。
-    - 若需处理上千条数据或支持复杂筛选，建议采用上述优化方案。
 
 '''
+EXPORT_COLUMNS = ('姓名', '手机号', '地址')
+EXPORT_GEO_COLUMNS = ('纬度', '经度', '地理编码状态')
+# 导出时每次从数据库游标取的行数
+EXPORT_YIELD_PER = 1000
+
+
+def iter_customers_csv(user_id, compress=False):
+    """流式导出 CSV，逐块产出 UTF-8 编码（compress=True 时为 gzip）的字节"""
+    buffer = StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    compressor = zlib.compressobj(wbits=31) if compress else None  # wbits=31 输出 gzip 格式
+
+    def drain():
+        data = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate(0)
+        return compressor.compress(data) if compressor else data
+
+    writer.writerow(EXPORT_COLUMNS)
+    yield drain()
+
+    stmt = (select(Customer.name, Customer.phone, Customer.address)
+            .where(Customer.owner_id == user_id)
+            .order_by(Customer.id)
+            .execution_options(stream_results=True, yield_per=EXPORT_YIELD_PER))
+    for rows in db.session.execute(stmt).partitions():
+        writer.writerows((name, phone or '', address) for name, phone, address in rows)
+        metrics.export_rows.inc(len(rows), format='csv')
+        chunk = drain()
+        if chunk:
+            yield chunk
+
+    if compressor:
+        yield compressor.flush()
+
+
+def write_customers_xlsx(user_id, with_geo=False, dir=None):
+    """
+    用 openpyxl 只写模式导出 XLSX，按游标逐行写入并落到临时文件，内存占用恒定。
+    with_geo=True 时追加 纬度/经度/地理编码状态 列。返回临时文件路径，由调用方负责删除。
+    dir 为临时文件目录（导出缓存目录），此时用 .tmp 后缀，避免写入过程中被缓存清理当作缓存文件淘汰。
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Sheet1')
+
+    columns = [Customer.name, Customer.phone, Customer.address]
+    header = list(EXPORT_COLUMNS)
+    if with_geo:
+        columns += [Customer.latitude, Customer.longitude, Customer.geocode_state, Customer.geocode_error]
+        header += list(EXPORT_GEO_COLUMNS)
+    sheet.append(header)
+
+    stmt = (select(*columns)
+            .where(Customer.owner_id == user_id)
+            .order_by(Customer.id)
+            .execution_options(stream_results=True, yield_per=EXPORT_YIELD_PER))
+    for rows in db.session.execute(stmt).partitions():
+        for row in rows:
+            values = [row[0], row[1] or '', row[2]]
+            if with_geo:
+                values += [row[3], row[4], geocode_status_text(row[5], row[6])]
+            sheet.append(values)
+        metrics.export_rows.inc(len(rows), format='xlsx')
+
+    fd, path = tempfile.mkstemp(suffix='.tmp' if dir else '.xlsx', prefix='customers_', dir=dir)
+    os.close(fd)
+    try:
+        workbook.save(path)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
 def output_excel(format,user_id):
     customers = Customer.query.filter_by(owner_id=user_id).all()
     data = []
@@ -504,18 +811,9 @@ def output_excel(format,user_id):
             }
         )
     df = pd.DataFrame(data)
+    metrics.export_rows.inc(len(data), format=format)
 
-    if format == 'csv':
-        output = StringIO()
-        df.to_csv(output, index=False)
-        output.seek(0)
-        return output
-    elif format == 'xlsx':
-        output = BytesIO()
-        df.to_excel(output, index=False,engine='openpyxl')
-        output.seek(0)
-        return output
-    elif format == 'xls':
+    if format == 'xls':
         output = BytesIO()
         df.to_excel(output, index=False,engine='xlwt')
         output.seek(0)
@@ -1,8 +1,23 @@
 import re
+import gzip
 import hashlib
 import os
+import unicodedata
+from flask import request
 from werkzeug.utils import secure_filename
 
+# brotli 已列入 requirements.txt；未安装时退回只使用 gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# pypinyin 未安装时不生成拼音列，拼音搜索不生效
+try:
+    from pypinyin import lazy_pinyin
+except ImportError:
+    lazy_pinyin = None
+
 # 工具类 用于处理成字符串
 def safe_str(value, default="未知错误"):
     if value is None:
@@ -35,6 +50,73 @@ def validate_phone(phone):
     return bool(re.match(pattern,phone))
 
 
+# 地址归一化：全角转半角、去掉所有空白、统一小写
+def normalize_address(address):
+    if not address:
+        return ''
+    address = unicodedata.normalize('NFKC', str(address))
+    address = re.sub(r'\s+', '', address)
+    return address.lower()
+
+
+# 归一化地址的哈希值，作为缓存和查重的键
+def address_hash(address):
+    return hashlib.sha256(normalize_address(address).encode('utf-8')).hexdigest()
+
+
+# 姓名转拼音全拼和首字母（小写、去掉非字母数字），如 张三 -> ('zhangsan', 'zs')
+def name_pinyin(name):
+    if not name or lazy_pinyin is None:
+        return None, None
+    syllables = [re.sub(r'[^0-9a-z]', '', s.lower()) for s in lazy_pinyin(name)]
+    syllables = [s for s in syllables if s]
+    if not syllables:
+        return None, None
+    full = ''.join(syllables)[:255]
+    initials = ''.join(s[0] for s in syllables)[:100]
+    return full, initials
+
+
+# 是否像拼音关键词（只有英文字母）
+def is_pinyin_keyword(keyword):
+    return bool(keyword) and keyword.isascii() and keyword.isalpha()
+
+
+# 解析地图视野范围 bbox=最小经度,最小纬度,最大经度,最大纬度，格式不对返回 None
+def parse_bbox(value):
+    if not value:
+        return None
+    try:
+        min_lng, min_lat, max_lng, max_lat = (float(v) for v in value.split(','))
+    except ValueError:
+        return None
+    if min_lng > max_lng or min_lat > max_lat:
+        return None
+    return min_lng, min_lat, max_lng, max_lat
+
+
+# 按浏览器的 Accept-Encoding 压缩响应，优先 br，其次 gzip；内容太小时不压缩
+def compress_response(response, min_size=1024):
+    if response.status_code != 200 or response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return response
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+
+    if brotli is not None and 'br' in request.accept_encodings:
+        data = brotli.compress(data, quality=5)
+        encoding = 'br'
+    elif 'gzip' in request.accept_encodings:
+        data = gzip.compress(data, compresslevel=6)
+        encoding = 'gzip'
+    else:
+        return response
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
 # 生成签名
 def generate_sign(params, security_key):
     # 参数排序
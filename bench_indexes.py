@@ -0,0 +1,156 @@
+'''
+客户表索引基准测试脚本（开发者使用）
+
+说明：
+- 在一个独立的数据库里造 100 万条客户数据（默认 SQLite 文件，不会碰正式库）。
+- 对查重、分页、计数、搜索排名等热点查询，分别在去掉索引和加上索引两种情况下
+  打印执行计划（SQLite: EXPLAIN QUERY PLAN，MySQL: EXPLAIN）和耗时。
+
+使用方法：
+    python bench_indexes.py
+    python bench_indexes.py --url mysql://root:密码@localhost/customer_map_bench --rows 1000000
+
+注意事项：
+- --url 指向的数据库里的 users / customers 表会被删除重建，不要指向正式库。
+- 只需要造一次数据，之后可加 --skip-seed 重复测试。
+'''
+
+
+import argparse
+import random
+import statistics
+import time
+from sqlalchemy import create_engine, insert, inspect, text
+from app import db
+from app.models import Customer, User
+from app.utils import address_hash, name_pinyin
+
+
+# 测试的索引：customers 上所有以 owner_id 开头的复合索引，去掉后即迁移前的表结构
+INDEXES = sorted(index.name for index in Customer.__table__.indexes
+                 if len(index.columns) > 1 and list(index.columns)[0].name == 'owner_id')
+# MySQL 外键列必须有索引，迁移前由外键自动建在 owner_id 上；去掉复合索引前先补上，加上复合索引后再删掉
+FK_INDEX = 'ix_customers_owner_id'
+
+SURNAMES = '王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗'
+GIVEN = '伟芳娜敏静丽强磊军洋勇艳杰娟涛明超秀霞平刚桂英华'
+DISTRICTS = ['朝阳区建国路', '海淀区中关村大街', '浦东新区世纪大道', '天河区天河路', '南山区科技园', '西湖区文三路']
+
+QUERIES = {
+    '手机号查重': "SELECT id FROM customers WHERE owner_id = :owner AND phone = :phone LIMIT 1",
+    '姓名地址查重': "SELECT id FROM customers WHERE owner_id = :owner AND name = :name "
+                    "AND address_hash = :hash LIMIT 1",
+    '列表翻页': "SELECT id, name, phone, address FROM customers WHERE owner_id = :owner AND id > :after "
+                "ORDER BY id LIMIT 11",
+    '客户计数': "SELECT count(*) FROM customers WHERE owner_id = :owner",
+    '搜索排名': "SELECT count(id) FROM customers WHERE owner_id = :owner AND id <= :after",
+}
+
+
+def seed(engine, rows, owners):
+    db.metadata.drop_all(engine, tables=[Customer.__table__, User.__table__])
+    db.metadata.create_all(engine, tables=[User.__table__, Customer.__table__])
+    rnd = random.Random(42)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{'id': i, 'username': f'bench{i}', 'password_hash': '-'}
+                                    for i in range(1, owners + 1)])
+    batch = []
+    start = time.perf_counter()
+    for i in range(1, rows + 1):
+        name = rnd.choice(SURNAMES) + rnd.choice(GIVEN) + rnd.choice(GIVEN)
+        address = f'{rnd.choice(DISTRICTS)}{rnd.randint(1, 999)}号'
+        full, initials = name_pinyin(name)
+        batch.append({'name': name,
+                      'name_pinyin': full,
+                      'name_initials': initials,
+                      'phone': f'1{rnd.randint(3, 9)}{i:09d}',
+                      'address': address,
+                      'address_hash': address_hash(address),
+                      'owner_id': rnd.randint(1, owners)})
+        if len(batch) == 10000 or i == rows:
+            with engine.begin() as conn:
+                conn.execute(insert(Customer), batch)
+            batch = []
+            print(f'\r已写入 {i}/{rows} 行', end='', flush=True)
+    print(f'，耗时 {time.perf_counter() - start:.1f}s')
+
+
+def sample_params(engine):
+    with engine.connect() as conn:
+        row = conn.execute(text('SELECT owner_id, name, phone, address_hash, id FROM customers '
+                                'ORDER BY id LIMIT 1 OFFSET :n'),
+                           {'n': conn.execute(text('SELECT count(*) FROM customers')).scalar() // 2}).one()
+    return {'owner': row.owner_id, 'name': row.name, 'phone': row.phone, 'hash': row.address_hash, 'after': row.id}
+
+
+def set_indexes(engine, enabled):
+    existing = {index.name: index for index in Customer.__table__.indexes}
+    mysql = engine.dialect.name == 'mysql'
+    with engine.begin() as conn:
+        fk_index = FK_INDEX in {row['name'] for row in inspect(conn).get_indexes('customers')}
+        if mysql and not enabled and not fk_index:
+            conn.execute(text(f'CREATE INDEX {FK_INDEX} ON customers (owner_id)'))
+        for name in INDEXES:
+            index = existing[name]
+            if enabled:
+                index.create(conn, checkfirst=True)
+            else:
+                index.drop(conn, checkfirst=True)
+        if mysql and enabled and fk_index:
+            conn.execute(text(f'DROP INDEX {FK_INDEX} ON customers'))
+        if engine.dialect.name == 'sqlite':
+            conn.execute(text('ANALYZE'))
+
+
+def explain(conn, sql, params):
+    if conn.dialect.name == 'sqlite':
+        rows = conn.execute(text('EXPLAIN QUERY PLAN ' + sql), params).all()
+        return '\n'.join(f'    {row[-1]}' for row in rows)
+    rows = conn.execute(text('EXPLAIN ' + sql), params).mappings().all()
+    return '\n'.join(f"    key={row.get('key')} rows={row.get('rows')} extra={row.get('Extra')}" for row in rows)
+
+
+def run(engine, params, repeat):
+    results = {}
+    with engine.connect() as conn:
+        for label, sql in QUERIES.items():
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                conn.execute(text(sql), params).all()
+                timings.append((time.perf_counter() - start) * 1000)
+            results[label] = statistics.median(timings)
+            print(f'  {label}: {results[label]:.2f} ms')
+            print(explain(conn, sql, params))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='客户表索引基准测试')
+    parser.add_argument('--url', default='sqlite:///bench_indexes.db', help='测试数据库地址，表会被重建')
+    parser.add_argument('--rows', type=int, default=1000000, help='造数据行数')
+    parser.add_argument('--owners', type=int, default=100, help='用户数')
+    parser.add_argument('--repeat', type=int, default=20, help='每条查询执行次数，取中位数')
+    parser.add_argument('--skip-seed', action='store_true', help='使用已有数据')
+    args = parser.parse_args()
+
+    engine = create_engine(args.url)
+    if not args.skip_seed:
+        seed(engine, args.rows, args.owners)
+    params = sample_params(engine)
+
+    print(f'\n== 去掉索引（{", ".join(INDEXES)}）==')
+    set_indexes(engine, False)
+    before = run(engine, params, args.repeat)
+
+    print('\n== 加上索引 ==')
+    set_indexes(engine, True)
+    after = run(engine, params, args.repeat)
+
+    print('\n== 对比（中位数）==')
+    for label in QUERIES:
+        print(f'  {label}: {before[label]:.2f} ms -> {after[label]:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+'''
+登录吞吐基准测试脚本（开发者使用）
+
+说明：
+- 本地模式：对比几种密码哈希参数下，单次校验耗时和 N 个并发登录时每秒能完成的校验次数，
+  用于选择 PASSWORD_HASH_METHOD 和 PASSWORD_HASH_WORKERS。
+- HTTP 模式：加 --url 时对运行中的服务并发提交登录表单，统计每秒登录数、延迟和繁忙（503）次数。
+
+使用方法：
+    python bench_login.py
+    python bench_login.py --methods scrypt:32768:8:1 scrypt:16384:8:1 pbkdf2:sha256:600000 --workers 2 --logins 200
+    python bench_login.py --url http://127.0.0.1:5000/login --username demo --password 123456 --concurrency 50 --logins 500
+'''
+
+
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from werkzeug.security import check_password_hash, generate_password_hash
+from config import PASSWORD_HASH_METHOD
+
+
+def bench_methods(methods, workers, logins):
+    print(f'并发线程数 {workers}，每种参数校验 {logins} 次')
+    for method in methods:
+        password_hash = generate_password_hash('bench-password', method=method)
+
+        start = time.perf_counter()
+        check_password_hash(password_hash, 'bench-password')
+        single = (time.perf_counter() - start) * 1000
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            start = time.perf_counter()
+            list(executor.map(lambda _: check_password_hash(password_hash, 'bench-password'), range(logins)))
+            elapsed = time.perf_counter() - start
+        print(f'  {method}: 单次 {single:.1f} ms，吞吐 {logins / elapsed:.1f} 次/秒')
+
+
+def _login(url, username, password):
+    start = time.perf_counter()
+    with requests.Session() as s:
+        resp = s.post(url, data={'username': username, 'password': password}, allow_redirects=False, timeout=60)
+    return resp.status_code, (time.perf_counter() - start) * 1000
+
+
+def bench_http(url, username, password, concurrency, logins):
+    print(f'{url}：并发 {concurrency}，共 {logins} 次登录')
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        start = time.perf_counter()
+        results = list(executor.map(lambda _: _login(url, username, password), range(logins)))
+        elapsed = time.perf_counter() - start
+
+    latencies = sorted(ms for _, ms in results)
+    ok = sum(1 for code, _ in results if code == 302)
+    busy = sum(1 for code, _ in results if code == 503)
+    print(f'  成功 {ok}，繁忙 {busy}，其他 {len(results) - ok - busy}')
+    print(f'  吞吐 {len(results) / elapsed:.1f} 次/秒，'
+          f'延迟中位数 {statistics.median(latencies):.0f} ms，p99 {latencies[int(len(latencies) * 0.99) - 1]:.0f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='登录吞吐基准测试')
+    parser.add_argument('--methods', nargs='+', default=[PASSWORD_HASH_METHOD, 'scrypt:16384:8:1', 'pbkdf2:sha256:600000'],
+                        help='要对比的哈希参数')
+    parser.add_argument('--workers', type=int, default=2, help='本地模式的哈希线程数')
+    parser.add_argument('--logins', type=int, default=100, help='登录（校验）次数')
+    parser.add_argument('--url', help='登录地址，指定时测试运行中的服务')
+    parser.add_argument('--username', default='')
+    parser.add_argument('--password', default='')
+    parser.add_argument('--concurrency', type=int, default=20, help='HTTP 模式的并发数')
+    args = parser.parse_args()
+
+    if args.url:
+        bench_http(args.url, args.username, args.password, args.concurrency, args.logins)
+    else:
+        bench_methods(args.methods, args.workers, args.logins)
+
+
+if __name__ == '__main__':
+    main()
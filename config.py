@@ -1,4 +1,5 @@
 import os
+import tempfile
 from datetime import timedelta
 from dotenv import load_dotenv
 load_dotenv()
@@ -10,6 +11,77 @@ GAODE_SECURITY_KEY = os.getenv('GAODE_SECURITY_KEY')
 GAODE_WEB_KEY = os.getenv('GAODE_WEB_KEY')
 GAODE_SECURITY_CODE = os.getenv('GAODE_SECURITY_CODE')
 
+# 高德 HTTP 客户端：连接池大小、5xx/超时重试次数、退避基数（秒）、连接超时和读取超时（秒）
+GAODE_POOL_SIZE = int(os.getenv('GAODE_POOL_SIZE', 10))
+GAODE_RETRIES = int(os.getenv('GAODE_RETRIES', 2))
+GAODE_RETRY_BACKOFF = float(os.getenv('GAODE_RETRY_BACKOFF', 0.5))
+GAODE_CONNECT_TIMEOUT = float(os.getenv('GAODE_CONNECT_TIMEOUT', 3))
+GAODE_READ_TIMEOUT = float(os.getenv('GAODE_READ_TIMEOUT', 8))
+
+# 地理编码后端：gaode（高德）、standin（本地替身服务 standin_gaode.py）、gazetteer（离线地名表 CSV/SQLite）
+GEOCODER_BACKEND = os.getenv('GEOCODER_BACKEND', 'gaode')
+GEOCODER_STANDIN_URL = os.getenv('GEOCODER_STANDIN_URL', 'http://127.0.0.1:8765')
+GEOCODER_GAZETTEER_PATH = os.getenv('GEOCODER_GAZETTEER_PATH')
+
+# 地理编码缓存：过期天数、最多保存条数
+GEOCODE_CACHE_TTL = timedelta(days=int(os.getenv('GEOCODE_CACHE_TTL_DAYS', 90)))
+GEOCODE_CACHE_MAX_ENTRIES = int(os.getenv('GEOCODE_CACHE_MAX_ENTRIES', 200000))
+
+# 并发地理编码：线程数、每秒请求数（与高德配额一致）、每多少条提交一次数据库
+GEOCODE_MAX_WORKERS = int(os.getenv('GEOCODE_MAX_WORKERS', 4))
+GEOCODE_QPS = float(os.getenv('GEOCODE_QPS', 3))
+# 限流是每个进程各自计数的，多进程部署（gunicorn -w N）时每个进程只用 GEOCODE_QPS / GEOCODE_PROCESSES，
+# 默认取 gunicorn 也会读取的 WEB_CONCURRENCY，没设置时为 1
+GEOCODE_PROCESSES = max(1, int(os.getenv('GEOCODE_PROCESSES', os.getenv('WEB_CONCURRENCY', 1))))
+GEOCODE_COMMIT_BATCH_SIZE = int(os.getenv('GEOCODE_COMMIT_BATCH_SIZE', 100))
+# 高德批量地理编码每次请求的地址数（1 表示逐条请求，最大 10）
+GEOCODE_BATCH_SIZE = int(os.getenv('GEOCODE_BATCH_SIZE', 10))
+
+# 地理编码失败重试的指数退避：第 n 次失败后等待 GEOCODE_RETRY_BASE * 2^(n-1) 秒，最长 GEOCODE_RETRY_MAX 秒
+GEOCODE_RETRY_BASE = int(os.getenv('GEOCODE_RETRY_BASE', 60))
+GEOCODE_RETRY_MAX = int(os.getenv('GEOCODE_RETRY_MAX', 24 * 3600))
+
+# 后台导入任务：上传文件暂存目录、工作线程数
+IMPORT_UPLOAD_DIR = os.getenv('IMPORT_UPLOAD_DIR', os.path.join(tempfile.gettempdir(), 'customer_map_imports'))
+IMPORT_WORKERS = int(os.getenv('IMPORT_WORKERS', 2))
+# running 状态超过这么多秒的导入任务视为已中断（服务重启时丢失），启动时和 flask resume-imports 会把它标记为失败
+IMPORT_STALE_AFTER = int(os.getenv('IMPORT_STALE_AFTER', 2 * 3600))
+# 导入时每块批量插入的行数
+IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', 500))
+
+# 导出文件缓存：缓存目录、最大总字节数（0 表示不缓存）
+EXPORT_CACHE_DIR = os.getenv('EXPORT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'customer_map_exports'))
+EXPORT_CACHE_MAX_BYTES = int(os.getenv('EXPORT_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+
+# 地图数据接口：按视野查询时默认和最多返回的客户数
+MAP_DATA_DEFAULT_LIMIT = int(os.getenv('MAP_DATA_DEFAULT_LIMIT', 1000))
+MAP_DATA_MAX_LIMIT = int(os.getenv('MAP_DATA_MAX_LIMIT', 5000))
+
+# 地图聚合：超过该缩放级别返回单个客户；每个瓦片切分的网格数；进程内缓存的瓦片数
+CLUSTER_MAX_ZOOM = int(os.getenv('CLUSTER_MAX_ZOOM', 14))
+CLUSTER_GRID = int(os.getenv('CLUSTER_GRID', 4))
+CLUSTER_CACHE_SIZE = int(os.getenv('CLUSTER_CACHE_SIZE', 4096))
+
+# 客户检索方式：auto 按数据库自动选择（MySQL FULLTEXT / SQLite FTS5），like 强制使用 LIKE
+SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'auto')
+
+# 密码哈希：werkzeug 的 method 参数（如 scrypt:32768:8:1、pbkdf2:sha256:600000），
+# 修改后用户下次登录时自动按新参数重新哈希
+PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+# 密码哈希线程数、最多排队的登录请求数（超出直接提示繁忙）、单次等待秒数
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+PASSWORD_HASH_QUEUE = int(os.getenv('PASSWORD_HASH_QUEUE', 32))
+PASSWORD_HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', 10))
+
+# 页面顶部显示的当前用户信息在进程内缓存的秒数（0 表示不缓存，每个请求查一次）
+USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 60))
+
+# 日志：级别（DEBUG/INFO/WARNING/ERROR，OFF 关闭）、格式（text 或 json）
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+# /metrics 访问令牌，为空时不校验
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
 # db
 SQLALCHEMY_DATABASE_URI = os.getenv('SQLALCHEMY_DATABASE_URI')
 SQLALCHEMY_TRACK_MODIFICATIONS = False
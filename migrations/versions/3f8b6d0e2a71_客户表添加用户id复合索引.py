@@ -0,0 +1,28 @@
+"""客户表添加用户id复合索引
+
+Revision ID: 3f8b6d0e2a71
+Revises: 7b5e2c14a9f3
+Create Date: 2026-10-18 17:45:09.513620
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f8b6d0e2a71'
+down_revision = '7b5e2c14a9f3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # address_hash 列及回填、(owner_id, name, address_hash) 索引见 ab9374db6229，
+    # (owner_id, phone) 索引见 9e3a7f52c0d4，这里补上按用户分页、计数、排名用的 (owner_id, id)
+    with op.batch_alter_table('customers', schema=None) as batch_op:
+        batch_op.create_index('ix_customers_owner_id_id', ['owner_id', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('customers', schema=None) as batch_op:
+        batch_op.drop_index('ix_customers_owner_id_id')
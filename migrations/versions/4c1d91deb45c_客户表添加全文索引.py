@@ -0,0 +1,37 @@
+"""客户表添加全文索引
+
+Revision ID: 4c1d91deb45c
+Revises: 5c1cfe6dd590
+Create Date: 2026-10-18 16:05:12.318604
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c1d91deb45c'
+down_revision = '5c1cfe6dd590'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'mysql':
+        # ngram 分词支持中文，索引由 MySQL 随表自动维护
+        op.execute('ALTER TABLE customers ADD FULLTEXT INDEX ft_customers_name_phone_address '
+                   '(name, phone, address) WITH PARSER ngram')
+    elif dialect == 'sqlite':
+        # FTS5 trigram 分词需要 SQLite 3.34+，由应用在增删改时同步
+        op.execute("CREATE VIRTUAL TABLE customers_fts USING fts5(name, phone, address, tokenize='trigram')")
+        op.execute("INSERT INTO customers_fts (rowid, name, phone, address) "
+                   "SELECT id, name, coalesce(phone, ''), address FROM customers")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'mysql':
+        op.execute('ALTER TABLE customers DROP INDEX ft_customers_name_phone_address')
+    elif dialect == 'sqlite':
+        op.execute('DROP TABLE customers_fts')
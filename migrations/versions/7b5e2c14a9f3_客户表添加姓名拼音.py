@@ -0,0 +1,64 @@
+"""客户表添加姓名拼音
+
+Revision ID: 7b5e2c14a9f3
+Revises: 9e3a7f52c0d4
+Create Date: 2026-10-18 17:12:48.226931
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.utils import name_pinyin
+
+
+# revision identifiers, used by Alembic.
+revision = '7b5e2c14a9f3'
+down_revision = '9e3a7f52c0d4'
+branch_labels = None
+depends_on = None
+
+# 回填已有客户时每批处理的行数
+BATCH_SIZE = 1000
+
+
+def upgrade():
+    with op.batch_alter_table('customers', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('name_pinyin', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('name_initials', sa.String(length=100), nullable=True))
+        batch_op.create_index('ix_customers_owner_name_pinyin', ['owner_id', 'name_pinyin'], unique=False)
+        batch_op.create_index('ix_customers_owner_name_initials', ['owner_id', 'name_initials'], unique=False)
+
+    # 回填已有客户的姓名拼音，按 id 分批
+    conn = op.get_bind()
+    customers = sa.table('customers',
+                         sa.column('id', sa.Integer),
+                         sa.column('name', sa.String),
+                         sa.column('name_pinyin', sa.String),
+                         sa.column('name_initials', sa.String))
+    update = (customers.update()
+              .where(customers.c.id == sa.bindparam('_id'))
+              .values(name_pinyin=sa.bindparam('_pinyin'), name_initials=sa.bindparam('_initials')))
+    last_id = 0
+    while True:
+        rows = conn.execute(sa.select(customers.c.id, customers.c.name)
+                            .where(customers.c.id > last_id)
+                            .order_by(customers.c.id)
+                            .limit(BATCH_SIZE)).all()
+        if not rows:
+            break
+        params = []
+        for row in rows:
+            full, initials = name_pinyin(row.name)
+            if full:
+                params.append({'_id': row.id, '_pinyin': full, '_initials': initials})
+        if params:
+            conn.execute(update, params)
+        last_id = rows[-1].id
+
+
+def downgrade():
+    with op.batch_alter_table('customers', schema=None) as batch_op:
+        batch_op.drop_index('ix_customers_owner_name_initials')
+        batch_op.drop_index('ix_customers_owner_name_pinyin')
+        batch_op.drop_column('name_initials')
+        batch_op.drop_column('name_pinyin')
@@ -0,0 +1,58 @@
+"""客户表添加地址哈希
+
+Revision ID: ab9374db6229
+Revises: 14d1578a0ce7
+Create Date: 2026-10-18 11:26:52.907314
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from app.utils import address_hash
+
+
+# revision identifiers, used by Alembic.
+revision = 'ab9374db6229'
+down_revision = '14d1578a0ce7'
+branch_labels = None
+depends_on = None
+
+# 回填时每批处理的行数
+BATCH_SIZE = 5000
+
+
+def upgrade():
+    with op.batch_alter_table('customers', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('address_hash', sa.String(length=64), nullable=True))
+
+    # 按主键分批回填已有数据的地址哈希
+    conn = op.get_bind()
+    customers = sa.table('customers',
+                         sa.column('id', sa.Integer),
+                         sa.column('address', sa.Text),
+                         sa.column('address_hash', sa.String))
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(customers.c.id, customers.c.address)
+              .where(customers.c.id > last_id)
+              .order_by(customers.c.id)
+              .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        conn.execute(
+            customers.update()
+                     .where(customers.c.id == sa.bindparam('_id'))
+                     .values(address_hash=sa.bindparam('_hash')),
+            [{'_id': row.id, '_hash': address_hash(row.address)} for row in rows]
+        )
+        last_id = rows[-1].id
+
+    with op.batch_alter_table('customers', schema=None) as batch_op:
+        batch_op.create_index('ix_customers_owner_name_address_hash', ['owner_id', 'name', 'address_hash'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('customers', schema=None) as batch_op:
+        batch_op.drop_index('ix_customers_owner_name_address_hash')
+        batch_op.drop_column('address_hash')
@@ -0,0 +1,73 @@
+"""地理编码状态拆分为状态和重试队列
+
+Revision ID: c6a4e1f08b37
+Revises: 3f8b6d0e2a71
+Create Date: 2026-10-18 18:20:41.370582
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c6a4e1f08b37'
+down_revision = '3f8b6d0e2a71'
+branch_labels = None
+depends_on = None
+
+# 与 app.models.GeocodeState 一致
+PENDING, OK, ERROR = 0, 1, 2
+
+
+def upgrade():
+    with op.batch_alter_table('customers', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('geocode_state', sa.SmallInteger(), nullable=False, server_default=str(PENDING)))
+        batch_op.add_column(sa.Column('geocode_error', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('geocode_attempts', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('geocode_next_retry_at', sa.DateTime(), nullable=True))
+
+    # 按原来的文字状态回填：成功 -> OK；空 -> PENDING；其他都是失败原因，立即可以重试
+    customers = sa.table('customers',
+                         sa.column('geocoded_status', sa.String),
+                         sa.column('geocode_state', sa.SmallInteger),
+                         sa.column('geocode_error', sa.String),
+                         sa.column('geocode_attempts', sa.Integer),
+                         sa.column('geocode_next_retry_at', sa.DateTime))
+    op.execute(customers.update()
+                        .where(customers.c.geocoded_status == '成功')
+                        .values(geocode_state=OK))
+    op.execute(customers.update()
+                        .where(customers.c.geocoded_status.isnot(None), customers.c.geocoded_status != '成功')
+                        .values(geocode_state=ERROR,
+                                geocode_error=customers.c.geocoded_status,
+                                geocode_attempts=1,
+                                geocode_next_retry_at=datetime.now()))
+
+    with op.batch_alter_table('customers', schema=None) as batch_op:
+        batch_op.create_index('ix_customers_owner_geocode_retry',
+                              ['owner_id', 'geocode_state', 'geocode_next_retry_at'], unique=False)
+        batch_op.drop_column('geocoded_status')
+
+
+def downgrade():
+    with op.batch_alter_table('customers', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('geocoded_status', sa.String(length=30), nullable=True))
+
+    customers = sa.table('customers',
+                         sa.column('geocoded_status', sa.String),
+                         sa.column('geocode_state', sa.SmallInteger),
+                         sa.column('geocode_error', sa.String))
+    op.execute(customers.update()
+                        .where(customers.c.geocode_state == OK)
+                        .values(geocoded_status='成功'))
+    op.execute(customers.update()
+                        .where(customers.c.geocode_state == ERROR)
+                        .values(geocoded_status=sa.func.substr(customers.c.geocode_error, 1, 30)))
+
+    with op.batch_alter_table('customers', schema=None) as batch_op:
+        batch_op.drop_index('ix_customers_owner_geocode_retry')
+        batch_op.drop_column('geocode_next_retry_at')
+        batch_op.drop_column('geocode_attempts')
+        batch_op.drop_column('geocode_error')
+        batch_op.drop_column('geocode_state')
@@ -0,0 +1,138 @@
+'''
+高德地理编码接口本地替身服务（开发者使用）
+
+说明：
+- 模拟 /v3/geocode/geo 接口（含 batch=true 批量模式），返回格式与高德一致，不校验 key 和签名。
+- 可注入延迟、HTTP 5xx 错误率、高德业务错误率（status=0）和查不到地址的比例，用于离线压测导入和失败重试。
+- 指定 --gazetteer 时从 CSV（address,latitude,longitude）取坐标，否则按地址哈希生成国内范围内的固定坐标。
+- 只依赖标准库。
+
+使用方法：
+1. 启动替身服务：python standin_gaode.py --port 8765 --latency 80 --jitter 40 --error-rate 0.02
+2. 应用配置 GEOCODER_BACKEND=standin、GEOCODER_STANDIN_URL=http://127.0.0.1:8765 后启动，
+   地理编码请求都会发到替身服务，结果不会写入地理编码缓存。
+'''
+
+
+import argparse
+import csv
+import hashlib
+import json
+import random
+import time
+import unicodedata
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def normalize(address):
+    # 与 app.utils.normalize_address 一致
+    return ''.join(unicodedata.normalize('NFKC', address).split()).lower()
+
+
+def load_gazetteer(path):
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        return {normalize(row['address']): (float(row['longitude']), float(row['latitude']))
+                for row in csv.DictReader(f) if row.get('address')}
+
+
+def fake_location(address):
+    # 按地址哈希生成固定坐标，同一地址每次结果相同
+    digest = hashlib.md5(address.encode('utf-8')).digest()
+    lng = 73.5 + int.from_bytes(digest[:4], 'big') / 2 ** 32 * (134.8 - 73.5)
+    lat = 18.2 + int.from_bytes(digest[4:8], 'big') / 2 ** 32 * (53.5 - 18.2)
+    return round(lng, 6), round(lat, 6)
+
+
+class Handler(BaseHTTPRequestHandler):
+    options = None
+    gazetteer = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != '/v3/geocode/geo':
+            self.send_json({'status': '0', 'info': 'INVALID_REQUEST', 'infocode': '20000'}, status=404)
+            return
+
+        opts = self.options
+        delay = max(0.0, random.gauss(opts.latency, opts.jitter)) / 1000 if opts.latency else 0
+        if delay:
+            time.sleep(delay)
+        if random.random() < opts.error_rate:
+            self.send_json({'status': '0', 'info': 'SERVICE_UNAVAILABLE'}, status=503)
+            return
+        if random.random() < opts.api_error_rate:
+            self.send_json({'status': '0', 'info': 'CUQPS_HAS_EXCEEDED_THE_LIMIT', 'infocode': '10021'})
+            return
+
+        params = parse_qs(url.query)
+        address = params.get('address', [''])[0]
+        batch = params.get('batch', ['false'])[0] == 'true'
+        addresses = address.split('|') if batch else [address]
+
+        geocodes = []
+        for item in addresses:
+            geocode = self.geocode(item)
+            if geocode is not None:
+                geocodes.append(geocode)
+            elif batch:
+                # 批量模式下查不到的地址也占一个位置，location 为空
+                geocodes.append({'formatted_address': [], 'location': [], 'level': [], 'adcode': []})
+        self.send_json({'status': '1', 'info': 'OK', 'infocode': '10000',
+                        'count': str(len(geocodes)), 'geocodes': geocodes})
+
+    def geocode(self, address):
+        if not address.strip() or random.random() < self.options.miss_rate:
+            return None
+        if self.gazetteer is not None:
+            location = self.gazetteer.get(normalize(address))
+            if location is None:
+                return None
+        else:
+            location = fake_location(normalize(address))
+        return {'formatted_address': address,
+                'country': '中国',
+                'level': '门牌号',
+                'location': f'{location[0]},{location[1]}',
+                'adcode': '000000'}
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json;charset=UTF-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if not self.options.quiet:
+            super().log_message(format, *args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='高德地理编码接口本地替身服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0, help='平均延迟（毫秒）')
+    parser.add_argument('--jitter', type=float, default=0, help='延迟标准差（毫秒）')
+    parser.add_argument('--error-rate', type=float, default=0, help='返回 HTTP 503 的比例')
+    parser.add_argument('--api-error-rate', type=float, default=0, help='返回 status=0（超出配额）的比例')
+    parser.add_argument('--miss-rate', type=float, default=0, help='查不到地址的比例')
+    parser.add_argument('--gazetteer', help='地名表 CSV（address,latitude,longitude），不指定时生成假坐标')
+    parser.add_argument('--quiet', action='store_true', help='不输出访问日志')
+    args = parser.parse_args()
+
+    Handler.options = args
+    Handler.gazetteer = load_gazetteer(args.gazetteer) if args.gazetteer else None
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    print(f'高德替身服务已启动: http://{args.host}:{args.port}/v3/geocode/geo')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
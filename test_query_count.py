@@ -0,0 +1,65 @@
+# 页面渲染的数据库查询次数测试：当前用户每个请求最多查一次，不能退回到每次渲染模板都查一次
+# 运行：python -m pytest -q test_query_count.py
+import os
+
+# config 在导入时读取环境变量，必须在导入 app 之前设置
+os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+os.environ.setdefault('SECRET_KEY', 'test')
+os.environ['GEOCODER_BACKEND'] = 'gazetteer'
+
+import pytest
+from app import create_app, db, metrics
+from app import auth, service
+from app.models import Customer, User
+from app.passwords import hash_password
+
+
+@pytest.fixture
+def client():
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        user = User(username='test', password_hash=hash_password('test'))
+        db.session.add(user)
+        db.session.commit()
+        for i in range(3):
+            db.session.add(Customer(owner_id=user.id, name=f'客户{i}', address=f'地址{i}'))
+        db.session.commit()
+
+    auth._user_cache.clear()
+    service._count_cache.clear()
+    client = app.test_client()
+    client.post('/login', data={'username': 'test', 'password': 'test'})
+    # 消费掉登录成功的提示消息
+    client.get('/')
+    yield client
+
+    with app.app_context():
+        db.drop_all()
+    auth._user_cache.clear()
+
+
+def count_queries(client, path):
+    before = metrics.db_queries.values.get((), 0)
+    response = client.get(path)
+    assert response.status_code == 200
+    return metrics.db_queries.values.get((), 0) - before
+
+
+def test_index_without_user_cache(client, monkeypatch):
+    # 不缓存用户时首页只查一次当前用户
+    monkeypatch.setattr(auth, 'USER_CACHE_TTL', 0)
+    assert count_queries(client, '/') == 1
+
+
+def test_index_with_user_cache(client):
+    # 用户已缓存时首页不查数据库
+    assert count_queries(client, '/') == 0
+
+
+def test_list_customers_without_user_cache(client, monkeypatch):
+    # 数据版本号（ETag，总数缓存也用它）、客户分页、总数、当前用户
+    monkeypatch.setattr(auth, 'USER_CACHE_TTL', 0)
+    assert count_queries(client, '/customers/') == 4
+    # 总数已缓存，当前用户仍然只查一次
+    assert count_queries(client, '/customers/') == 3